@@ -1,53 +1,43 @@
 import os
-import google.generativeai as genai
-import dotenv
+import json
+import logging
+from deadline import BudgetExceeded, mark_partial
+from jobs import report_stage, report_event
+from telemetry import log_event, record_error
+from llm import get_client, MODEL_NAME
 
-dotenv.load_dotenv() 
+# Bump whenever the prompts below change so cached results are not reused
+PROMPT_VERSION = "2"
+# "two-call": description, then findings from the description (default)
+# "structured": both in one JSON-mode call, falling back to two-call on a bad response
+AI_RESPONSE_MODE = os.environ.get("AI_RESPONSE_MODE", "two-call")
 
-def file_description_and_keyfindings(prompt: str) -> str:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel('gemini-2.5-flash')
-
-    description_prompt = f"""
-    You are an expert descriptive analyst. Your task is to provide a brief, concise, and highly visual description of an object or scenario.
-
-The description must adhere strictly to the following format:
-1.  **Title:** A one-to-three-word title for the object/system.
-2.  **Body:** A description, spanning 2-4 short, separate lines, focusing only on visually verifiable details. Do not interpret or analyze the function.
-Do NOT include any headings like 'Title' or 'Body'.
----
-**Examples to Follow:**
-
-Access Card Reader
-
-A person is holding an access card against a
-card reader mounted near a door labeled "211
-IDF/Electrical." The card reader has a light
-indicator.
-
-Biometric Attendance/Access System
-
-A wall-mounted electronic biometric device
-with fingerprint scanning, keypad, and display
-screen showing time.
-
-Visitors Logbook
-
-A paper-based visitor logbook where
-individuals manually write their name, reason
-for visit, time in/out, and provide a signature.
-Two entries are already filled in.
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "key_findings": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["description", "key_findings"],
+}
 
+STRUCTURED_INSTRUCTIONS = """
 ---
-**New Item to Describe:**
-{prompt}
+**Output Format:**
+Return a JSON object with two fields:
+- "description": the description above, exactly as you would write it (title line, blank line, body lines).
+- "key_findings": 3-5 short findings about the described system, one per array item and without leading dashes,
+  covering its purpose, functionality, advantages, and potential vulnerabilities. For example, for an
+  access card reader: "Digital access control system using ID/employee cards.", "Dependent on card validity
+  and system integrity (e.g., cards can be lost or borrowed)."
 """
 
-    response = model.generate_content(description_prompt)
-    
-    file_description = response.text 
+def get_model():
+    """Shared, rate-limited client for the configured backend (see llm.py)."""
+    return get_client()
 
-    prompt = f"""
+def build_findings_prompt(file_description: str) -> str:
+    return f"""
     Analyze the following file description and extract the key findings. The findings should summarize the system's purpose, functionality, advantages, and potential vulnerabilities. Follow the format of the examples provided.
     Don't include 'Key Findings' heading.
     ---
@@ -98,22 +88,221 @@ Two entries are already filled in.
 
     **Key Findings:**
     """
-    
-    response = model.generate_content(prompt)
-    raw_findings = response.text.strip()
-    cleaned_findings_text = raw_findings.replace('\n-', '\n').replace('- ', '\n').replace('\n\n', '\n')
+
+def format_findings(raw_findings: str) -> str:
+    """Normalise a findings answer into "- item" lines."""
+    cleaned_findings_text = raw_findings.strip().replace('\n-', '\n').replace('- ', '\n').replace('\n\n', '\n')
     findings_list = [
         item.strip()
         for item in cleaned_findings_text.split('\n')
         if item.strip()
     ]
-    final_findings = "\n".join(f"- {finding}" for finding in findings_list)
+    return "\n".join(f"- {finding}" for finding in findings_list)
+
+def _describe_then_find(model, description_contents):
+    """Two sequential calls: description, then key findings from that description."""
+    report_stage("describing")
+    response = model.generate_content(description_contents)
+    file_description = response.text
+
+    report_stage("findings")
+    try:
+        response = model.generate_content(build_findings_prompt(file_description))
+    except BudgetExceeded:
+        mark_partial("findings")
+        return file_description, ""
+    return file_description, format_findings(response.text)
+
+STRUCTURED_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+
+def _structured_contents(description_contents):
+    if isinstance(description_contents, str):
+        return description_contents + STRUCTURED_INSTRUCTIONS
+    return [description_contents[0] + STRUCTURED_INSTRUCTIONS, *description_contents[1:]]
+
+def _parse_structured(response_text):
+    data = json.loads(response_text)
+    file_description = data["description"]
+    findings = data["key_findings"]
+    if not isinstance(file_description, str) or not isinstance(findings, list):
+        raise ValueError("Unexpected structured response shape")
+    report_stage("findings")
+    final_findings = "\n".join(f"- {str(item).strip().lstrip('- ')}" for item in findings if str(item).strip())
+    return file_description.strip(), final_findings
+
+def _describe_and_find_structured(model, description_contents):
+    """One JSON-mode call returning both; raises ValueError if the answer does not parse."""
+    report_stage("describing")
+    response = model.generate_content(_structured_contents(description_contents), generation_config=STRUCTURED_CONFIG)
+    return _parse_structured(response.text)
+
+def describe_and_find(model, description_contents):
+    """(description, findings) for a description prompt (or [prompt, image]) in the configured mode.
+
+    Past the request's deadline, whatever was generated is returned ("" for the rest).
+    """
+    try:
+        if AI_RESPONSE_MODE == "structured":
+            try:
+                return _describe_and_find_structured(model, description_contents)
+            except (ValueError, KeyError, TypeError) as e:
+                record_error("structured_response", e)
+        return _describe_then_find(model, description_contents)
+    except BudgetExceeded:
+        mark_partial("describe")
+        return "", ""
+
+def build_description_prompt(prompt: str) -> str:
+    """The description prompt for a document's (budgeted, masked) content."""
+    return f"""
+    You are an expert descriptive analyst. Your task is to provide a brief, concise, and highly visual description of an object or scenario.
+
+The description must adhere strictly to the following format:
+1.  **Title:** A one-to-three-word title for the object/system.
+2.  **Body:** A description, spanning 2-4 short, separate lines, focusing only on visually verifiable details. Do not interpret or analyze the function.
+Do NOT include any headings like 'Title' or 'Body'.
+---
+**Examples to Follow:**
+
+Access Card Reader
+
+A person is holding an access card against a
+card reader mounted near a door labeled "211
+IDF/Electrical." The card reader has a light
+indicator.
+
+Biometric Attendance/Access System
+
+A wall-mounted electronic biometric device
+with fingerprint scanning, keypad, and display
+screen showing time.
+
+Visitors Logbook
+
+A paper-based visitor logbook where
+individuals manually write their name, reason
+for visit, time in/out, and provide a signature.
+Two entries are already filled in.
+
+---
+**New Item to Describe:**
+{prompt}
+"""
+
+def build_refresh_prompt(file_description: str, added_text: str) -> str:
+    """Prompt to update a near-duplicate document's description with the lines new to this version."""
+    return f"""
+    Below is the description of a document, followed by the lines that were added in a newer version of it.
+    Update the description so it also covers the added lines. Keep its format (a one-to-three-word title, a blank line, then 2-4 short lines) and keep its wording wherever the added lines do not change it.
+    If they change nothing worth describing, return the description unchanged. Return only the description.
+    ---
+    **Current Description:**
+{file_description}
+
+    **Added Lines:**
+{added_text}
+"""
+
+def _with_defaults(file_description, final_findings):
     if not file_description:
         file_description = "No description generated."
     if not final_findings:
         final_findings = "No key findings generated."
-    print("DEBUG: file_description =", file_description)
-    print("DEBUG: final_findings =", final_findings)
+    log_event(
+        logging.DEBUG, "described", description_chars=len(file_description), findings_chars=len(final_findings)
+    )
     return file_description,final_findings
 
+def file_description_and_keyfindings(prompt: str) -> str:
+    model = get_model()
+    description_prompt = build_description_prompt(prompt)
+
+    file_description, final_findings = describe_and_find(model, description_prompt)
+    return _with_defaults(file_description, final_findings)
+
+def refresh_description(file_description: str, added_text: str) -> str:
+    """One model call updating a prior description for a near-duplicate document (see text_index.py)."""
+    report_stage("refreshing")
+    try:
+        response = get_model().generate_content(build_refresh_prompt(file_description, added_text))
+    except BudgetExceeded:
+        mark_partial("refresh")
+        return file_description
+    return response.text or file_description
+
+def describe_and_find_streaming(model, description_contents):
+    """Two-call flow that reports the description as "description" events while it is generated.
+
+    Used by /upload/stream in either response mode: a JSON answer cannot be shown as it arrives.
+    """
+    report_stage("describing")
+    parts = []
+    try:
+        for text in model.generate_content_stream(description_contents):
+            parts.append(text)
+            report_event("description", delta=text)
+    except BudgetExceeded:
+        # Keep what was streamed so far; findings need a finished description
+        mark_partial("describe", streamed_chars=sum(map(len, parts)))
+        return "".join(parts), ""
+    file_description = "".join(parts)
+
+    report_stage("findings")
+    try:
+        response = model.generate_content(build_findings_prompt(file_description))
+    except BudgetExceeded:
+        mark_partial("findings")
+        return file_description, ""
+    return file_description, format_findings(response.text)
+
+def file_description_and_keyfindings_streaming(prompt: str):
+    file_description, final_findings = describe_and_find_streaming(get_model(), build_description_prompt(prompt))
+    return _with_defaults(file_description, final_findings)
+
+# Async counterparts for the asyncio server (async_app.py): same prompts and modes,
+# awaiting the model's generate_content_async instead of blocking a thread
+async def _describe_then_find_async(model, description_contents):
+    report_stage("describing")
+    response = await model.generate_content_async(description_contents)
+    file_description = response.text
+
+    report_stage("findings")
+    try:
+        response = await model.generate_content_async(build_findings_prompt(file_description))
+    except BudgetExceeded:
+        mark_partial("findings")
+        return file_description, ""
+    return file_description, format_findings(response.text)
+
+async def _describe_and_find_structured_async(model, description_contents):
+    report_stage("describing")
+    response = await model.generate_content_async(
+        _structured_contents(description_contents), generation_config=STRUCTURED_CONFIG
+    )
+    return _parse_structured(response.text)
+
+async def describe_and_find_async(model, description_contents):
+    try:
+        if AI_RESPONSE_MODE == "structured":
+            try:
+                return await _describe_and_find_structured_async(model, description_contents)
+            except (ValueError, KeyError, TypeError) as e:
+                record_error("structured_response", e)
+        return await _describe_then_find_async(model, description_contents)
+    except BudgetExceeded:
+        mark_partial("describe")
+        return "", ""
+
+async def file_description_and_keyfindings_async(prompt: str):
+    file_description, final_findings = await describe_and_find_async(get_model(), build_description_prompt(prompt))
+    return _with_defaults(file_description, final_findings)
+
 
+async def refresh_description_async(file_description: str, added_text: str) -> str:
+    report_stage("refreshing")
+    try:
+        response = await get_model().generate_content_async(build_refresh_prompt(file_description, added_text))
+    except BudgetExceeded:
+        mark_partial("refresh")
+        return file_description
+    return response.text or file_description
@@ -1,82 +1,187 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-import os
+import json
 
-# Import your file-processing functions
-from excel import excel_main
-from ppt import ppt_main
-from new_pdf import pdf_main
-from image import image_file_description_and_keyfindings
+from deadline import BudgetExceeded, request_budget
+from extractors import start_warm_up, type_for_extension
+from jobs import job_manager, JobQueueFull, JOB_RETRY_AFTER
+from pipeline import (
+    allowed_file, cache_mode, get_file_type, analyze_file, invalidate_results, run_job, run_streaming_job,
+)
+from spool import spool_upload, upload_stream_factory, UploadTooLarge, MAX_UPLOAD_BYTES
+from telemetry import span, record_error, render_metrics
 
-# Flask app setup
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+class UploadRequest(Request):
+    """Has the form parser write uploads straight into a hashing spool (see spool.py)
+    instead of Werkzeug's temp file for anything over 500 KB."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_stream_factory(total_content_length, content_type, filename, content_length)
 
+# Flask app setup
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)  # Allow cross-origin requests from Node frontend
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Uploads are spooled in memory (see spool.py); this also rejects oversized bodies early
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 1024 * 1024  # + multipart overhead
+
+# Optional: import extractors in the background so the first request doesn't pay for it
+start_warm_up()
 
-ALLOWED_EXTENSIONS = {"pdf", "ppt", "pptx", "xls", "xlsx", "jpg", "png"}
+def get_cache_mode():
+    """Per-request cache mode: ?cache=use|refresh|bypass (Cache-Control: no-cache means refresh)."""
+    return cache_mode(request.args, request.headers)
 
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+def get_budget():
+    """Per-request time budget in seconds: ?budget=, at most REQUEST_BUDGET_SECONDS."""
+    return request_budget(request.args)
 
 # Test route to check server
 @app.route("/", methods=["GET"])
 def home():
     return "Flask server is running!"
 
-# Upload route
-@app.route("/upload", methods=["POST"])
-def upload_file():
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+def receive_upload():
+    """Validate and spool the request's file: (upload, file_type, None) or (None, None, error response)."""
+    try:
+        # Parsing the form reads the body into the upload's spool, hashing it on the way
+        with span("save") as save:
+            file = request.files.get("file")
+            if file is not None and "." in file.filename:
+                save["file_type"] = type_for_extension(file.filename.rsplit(".", 1)[1])
+            save["bytes"] = request.content_length
+    except UploadTooLarge as e:
+        return None, None, (jsonify({"error": str(e)}), 413)
+    if file is None:
+        return None, None, (jsonify({"error": "No file uploaded"}), 400)
 
-    file = request.files["file"]
     if file.filename == "":
-        return jsonify({"error": "No file selected"}), 400
+        return None, None, (jsonify({"error": "No file selected"}), 400)
 
     if not allowed_file(file.filename):
-        return jsonify({"error": "File type not allowed"}), 400
+        return None, None, (jsonify({"error": "File type not allowed"}), 400)
 
     filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(filepath)
-
     ext = filename.rsplit(".", 1)[1].lower()
+
+    upload = spool_upload(file.stream, filename)
+
+    file_type = get_file_type(upload, ext)
+    if file_type is None:
+        upload.close()
+        return None, None, (jsonify({"error": "Unsupported file type"}), 400)
+    return upload, file_type, None
+
+# Upload route
+@app.route("/upload", methods=["POST"])
+def upload_file():
+    upload, file_type, error = receive_upload()
+    if error is not None:
+        return error
+
+    if request.args.get("async", "").lower() in ("1", "true", "yes"):
+        return submit_job(upload, file_type)
+
     try:
-        if ext == "pdf":
-            file_description, key_findings = pdf_main(filepath)
-            file_type = "PDF"
-        elif ext in ["ppt", "pptx"]:
-            file_description, key_findings = ppt_main(filepath)
-            file_type = "PPT"
-        elif ext in ["xls", "xlsx"]:
-            file_description, key_findings = excel_main(filepath)
-            file_type = "Excel"
-        elif ext in ["jpg", "png"]:
-            file_description, key_findings = image_file_description_and_keyfindings(filepath)
-            file_type = "Image"
-        else:
-            return jsonify({"error": "Unsupported file type"}), 400
-        
-        print("DEBUG: JSON to send:", {
-    "filename": filename,
-    "file_type": file_type,
-    "file_description": file_description,
-    "key_findings": key_findings
-})
-
-
-        return jsonify({
-            "filename": filename,
-            "file_type": file_type,
-            "file_description": file_description,
-            "key_findings": key_findings
-        })
+        with upload:
+            return jsonify(analyze_file(upload, file_type, get_cache_mode(), get_budget()))
+    except BudgetExceeded as e:
+        record_error("request", e, file_type=file_type, filename=upload.filename)
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
+        record_error("request", e, file_type=file_type, filename=upload.filename)
         return jsonify({"error": str(e)}), 500
 
+# Streaming upload: one JSON object per line as results become available:
+# stage (extracting/ocr/summarizing/describing/findings), extracted, description
+# (text deltas), findings, then done (with the same body /upload returns) or error
+@app.route("/upload/stream", methods=["POST"])
+def upload_file_stream():
+    upload, file_type, error = receive_upload()
+    if error is not None:
+        return error
+
+    job, busy = queue_job(upload, run_streaming_job, file_type)
+    if busy is not None:
+        return busy
+
+    def stream():
+        yield json.dumps({"event": "accepted", "job_id": job.id, "filename": job.filename}) + "\n"
+        for event in iter_job_events(job):
+            if event is None:
+                event = {"event": "keep-alive"}
+            elif event["event"] == "done":
+                event = {**event, "result": job.result}
+            yield json.dumps(event) + "\n"
+
+    return Response(stream(), mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+def queue_job(upload, func, file_type):
+    """Hand an upload to the job pool: (job, None), or (None, 503 response) when saturated."""
+    try:
+        return job_manager.submit(upload.filename, func, upload, file_type, get_cache_mode(), get_budget()), None
+    except JobQueueFull:
+        upload.close()
+        response = jsonify({"error": "Server busy, job queue is full"})
+        response.headers["Retry-After"] = str(JOB_RETRY_AFTER)
+        return None, (response, 503)
+
+def iter_job_events(job):
+    """A job's events as they happen, with None for each idle keep-alive interval."""
+    sent = 0
+    while True:
+        events, finished = job.wait_events(sent)
+        yield from events
+        sent += len(events)
+        if finished:
+            return
+        if not events:
+            yield None
+
+def submit_job(upload, file_type):
+    """Queue an upload for background processing; 202 with the job id, 503 when saturated."""
+    job, busy = queue_job(upload, run_job, file_type)
+    if busy is not None:
+        return busy
+    response = jsonify({"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return response, 202
+
+# Job status and result
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+# Server-sent progress events: queued, running, stage (extracting/ocr/describing/findings), done/error
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def stream():
+        for event in iter_job_events(job):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Drop cached results for a file (by SHA-256 of its bytes)
+@app.route("/cache/<content_hash>", methods=["DELETE"])
+def invalidate_cache(content_hash):
+    invalidate_results(content_hash.lower())
+    return jsonify({"invalidated": content_hash.lower()})
+
+# Prometheus scrape endpoint (per process)
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,174 @@
+"""Asyncio serving mode: the same /upload JSON contract as app.py, many uploads in flight per process.
+
+    python async_app.py
+    hypercorn async_app:app --bind 0.0.0.0:5000 --workers 2
+
+Model calls are awaited through the async generation API and capped at
+LLM_ASYNC_CONCURRENCY per process (llm.py). Parsing, masking, prompt building
+and image preprocessing run on a thread pool so they never block the event
+loop; OCR fans out from there to its own process pool (ocr.py).
+
+Background jobs (?async=1, /jobs) are only served by app.py.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Request, request, jsonify, Response
+from quart_cors import cors
+from werkzeug.utils import secure_filename
+
+from ai import get_model, describe_and_find_async, file_description_and_keyfindings_async, refresh_description_async
+from deadline import BudgetExceeded, deadline_scope, request_budget, REQUEST_BUDGET_SECONDS
+from extractors import get_extractor, start_warm_up, type_for_extension
+from pipeline import (
+    allowed_file, cache_mode, get_file_type, lookup_result, store_result, build_response, match_text, remember_text,
+    require_text, invalidate_results,
+)
+from spool import spool_upload, upload_stream_factory, UploadTooLarge, MAX_UPLOAD_BYTES
+from telemetry import span, request_context, record_error, render_metrics, BYTES_PROCESSED
+
+# Threads for blocking extraction work; most of their time is spent in C code or waiting on OCR processes
+ASYNC_CPU_WORKERS = int(os.environ.get("ASYNC_CPU_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+class UploadRequest(Request):
+    """Has the form parser write uploads straight into a hashing spool (see spool.py)."""
+
+    def make_form_data_parser(self):
+        parser = super().make_form_data_parser()
+        parser.stream_factory = upload_stream_factory
+        return parser
+
+
+app = cors(Quart(__name__))  # Allow cross-origin requests from Node frontend
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 1024 * 1024  # + multipart overhead
+
+cpu_pool = ThreadPoolExecutor(max_workers=ASYNC_CPU_WORKERS, thread_name_prefix="extract")
+
+start_warm_up()
+
+
+# ------------------- Pipeline -------------------
+async def run_cpu(func, *args):
+    """Run blocking work on the extraction pool, keeping the request's telemetry context."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, functools.partial(contextvars.copy_context().run, func, *args))
+
+
+async def analyze_image_async(image, source, stats, mode="use", content_hash=None):
+    img, image_hash, report, prior = await run_cpu(image.prepare_image, source, stats, mode)
+    if prior is not None:
+        return prior
+    start = time.perf_counter()
+    file_description, final_findings = await describe_and_find_async(get_model(), [image.DESCRIPTION_PROMPT, img])
+    report["llm_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    await run_cpu(image.remember_image, image_hash, file_description, final_findings, mode, content_hash)
+    return file_description, final_findings
+
+
+async def process_file_async(source, file_type, stats, mode="use", content_hash=None):
+    """process_file() with the model calls awaited instead of blocking."""
+    extractor = get_extractor(file_type)
+    module = await run_cpu(extractor.load)  # first use imports pandas/pptx/...
+    if extractor.text_function is None:
+        return await analyze_image_async(module, source, stats, mode, content_hash)
+    text = await run_cpu(extractor.extract_text, source, stats, mode, content_hash)
+    require_text(text, file_type)
+    signature, match = await run_cpu(match_text, text, file_type, stats, mode)
+    if match is not None:
+        file_description, key_findings = match.value
+        if match.added_text:
+            file_description = await refresh_description_async(file_description, match.added_text)
+            await run_cpu(remember_text, signature, text, file_type, file_description, key_findings, content_hash)
+        return file_description, key_findings
+    prompt = await run_cpu(extractor.build_prompt, text, mode, content_hash)
+    result = await file_description_and_keyfindings_async(prompt)
+    await run_cpu(remember_text, signature, text, file_type, *result, content_hash)
+    return result
+
+
+async def analyze_file_async(upload, file_type, mode, budget=REQUEST_BUDGET_SECONDS):
+    """Cache lookup, then extraction + LLM analysis within budget seconds; returns the JSON response body."""
+    start = time.perf_counter()
+    with request_context(file_type, upload.size), deadline_scope(budget) as deadline:
+        cache_key, cached = await run_cpu(lookup_result, upload, file_type, mode)
+        stats = {}
+        if cached is not None:
+            file_description, key_findings = cached
+        else:
+            BYTES_PROCESSED.inc(upload.size, file_type=file_type)
+            with span("analyze"):
+                file_description, key_findings = await process_file_async(
+                    upload.source(), file_type, stats, mode, upload.sha256
+                )
+            await run_cpu(store_result, cache_key, mode, file_description, key_findings)
+        return build_response(
+            upload, file_type, file_description, key_findings, cached is not None, stats, start, deadline
+        )
+
+
+# ------------------- Routes -------------------
+@app.route("/", methods=["GET"])
+async def home():
+    return "Async server is running!"
+
+
+@app.route("/upload", methods=["POST"])
+async def upload_file():
+    try:
+        # Parsing the form reads the body into the upload's spool, hashing it on the way
+        with span("save") as save:
+            file = (await request.files).get("file")
+            if file is not None and "." in file.filename:
+                save["file_type"] = type_for_extension(file.filename.rsplit(".", 1)[1])
+            save["bytes"] = request.content_length
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    if file is None:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    if file.filename == "":
+        return jsonify({"error": "No file selected"}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({"error": "File type not allowed"}), 400
+
+    filename = secure_filename(file.filename)
+    ext = filename.rsplit(".", 1)[1].lower()
+
+    upload = spool_upload(file.stream, filename)
+    file_type = await run_cpu(get_file_type, upload, ext)
+    if file_type is None:
+        upload.close()
+        return jsonify({"error": "Unsupported file type"}), 400
+
+    try:
+        with upload:
+            return jsonify(await analyze_file_async(
+                upload, file_type, cache_mode(request.args, request.headers), request_budget(request.args)
+            ))
+    except BudgetExceeded as e:
+        record_error("request", e, file_type=file_type, filename=filename)
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        record_error("request", e, file_type=file_type, filename=filename)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/cache/<content_hash>", methods=["DELETE"])
+async def invalidate_cache(content_hash):
+    await run_cpu(invalidate_results, content_hash.lower())
+    return jsonify({"invalidated": content_hash.lower()})
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    app.run(port=5000)
@@ -0,0 +1,182 @@
+"""Bulk-classify every supported file under a directory.
+
+    python batch.py <input_dir> <output.jsonl> [--workers N] [--llm-concurrency N] [--no-resume]
+
+Files are picked by extension and typed by content, as uploads are (extractors.py).
+Extraction (parsing, OCR, masking) runs in a process pool; the LLM stage runs on
+a bounded thread pool. Each result is appended to the JSONL file as it finishes,
+and a rerun skips files already recorded there as "ok" (failures are retried).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from extractors import get_extractor, sniff_file_type, type_for_extension
+
+
+# ------------------- Discovery / checkpoint -------------------
+def find_files(input_dir):
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if type_for_extension(ext) is not None:
+                yield os.path.join(root, name), ext
+
+
+def file_key(path):
+    """Checkpoint identity: a file is redone if it moves or changes."""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def load_checkpoint(output_path):
+    """Keys of files already recorded as ok in an earlier run's output."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial line from an interrupted write
+            if record.get("status") == "ok":
+                done.add(record["key"])
+    return done
+
+
+# ------------------- Stages -------------------
+def _init_extract_worker():
+    # Each extraction process OCRs in-process, without a pool of its own (which it
+    # would never shut down); the batch pool provides the parallelism
+    import ocr
+    ocr.OCR_WORKERS = 1
+
+
+def extract(path, ext):
+    """CPU stage (runs in a worker process): returns (file type, masked text or None for images)."""
+    file_type = sniff_file_type(path, ext)
+    if file_type is None:
+        raise ValueError("Unsupported file type")
+    extractor = get_extractor(file_type)
+    if extractor.text_function is None:
+        return file_type, None
+    return file_type, extractor.extract_text(path)
+
+
+def analyze(path, file_type, text):
+    """LLM stage (runs on a thread): returns (description, findings)."""
+    extractor = get_extractor(file_type)
+    if extractor.text_function is None:
+        return extractor.run(path)
+    if not text:
+        raise ValueError("No text could be extracted")
+    from ai import file_description_and_keyfindings
+    return file_description_and_keyfindings(extractor.build_prompt(text))
+
+
+# ------------------- Runner -------------------
+def run(input_dir, output_path, workers=None, llm_concurrency=4, resume=True):
+    done = load_checkpoint(output_path) if resume else set()
+    stats = {"ok": 0, "failed": 0, "skipped": 0, "bytes": 0}
+    failures = []
+    started = time.perf_counter()
+
+    def record(out, path, file_type, key, size, result=None, error=None, elapsed=0.0):
+        entry = {"path": path, "key": key, "file_type": file_type, "bytes": size, "seconds": round(elapsed, 3)}
+        if error is None:
+            entry.update(status="ok", file_description=result[0], key_findings=result[1])
+            stats["ok"] += 1
+            stats["bytes"] += size
+        else:
+            entry.update(status="error", error=error)
+            stats["failed"] += 1
+            failures.append((path, error))
+        out.write(json.dumps(entry) + "\n")
+        out.flush()
+
+    workers = workers or os.cpu_count() or 1
+    files = iter(find_files(input_dir))
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker) as cpu_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        extracting = {}
+        analyzing = {}
+        exhausted = False
+        while True:
+            # Keep the extraction pool fed, but only a couple of files ahead per worker
+            while not exhausted and len(extracting) < 2 * workers and len(analyzing) < 4 * llm_concurrency:
+                try:
+                    path, ext = next(files)
+                except StopIteration:
+                    exhausted = True
+                    break
+                key = file_key(path)
+                if key in done:
+                    stats["skipped"] += 1
+                    continue
+                # Typed by extension until extraction has sniffed the content
+                info = (path, type_for_extension(ext), key, os.path.getsize(path), time.perf_counter())
+                extracting[cpu_pool.submit(extract, path, ext)] = info
+
+            if not extracting and not analyzing:
+                break
+            finished, _ = wait(list(extracting) + list(analyzing), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in extracting:
+                    info = extracting.pop(future)
+                    try:
+                        file_type, text = future.result()
+                    except Exception as e:
+                        record(out, *info[:4], error=f"extract: {e}", elapsed=time.perf_counter() - info[4])
+                        continue
+                    info = (info[0], file_type, *info[2:])
+                    analyzing[llm_pool.submit(analyze, info[0], file_type, text)] = info
+                else:
+                    info = analyzing.pop(future)
+                    elapsed = time.perf_counter() - info[4]
+                    try:
+                        result = future.result()
+                        if not isinstance(result, tuple):
+                            raise ValueError(str(result))
+                        record(out, *info[:4], result=result, elapsed=elapsed)
+                    except Exception as e:
+                        record(out, *info[:4], error=f"analyze: {e}", elapsed=elapsed)
+
+    stats["seconds"] = time.perf_counter() - started
+    print_summary(stats, failures)
+    return stats
+
+
+def print_summary(stats, failures):
+    seconds = stats["seconds"] or 1e-9
+    processed = stats["ok"] + stats["failed"]
+    print(
+        f"Processed {processed} file(s) in {stats['seconds']:.1f}s "
+        f"({processed / seconds:.2f} files/s, {stats['bytes'] / seconds / 1024 / 1024:.2f} MB/s); "
+        f"ok={stats['ok']} failed={stats['failed']} skipped={stats['skipped']} (already done)"
+    )
+    for path, error in failures[:20]:
+        print(f"  FAILED {path}: {error}")
+    if len(failures) > 20:
+        print(f"  ... and {len(failures) - 20} more")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-classify evidence files into a JSONL report.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="concurrent LLM analyses")
+    parser.add_argument("--no-resume", action="store_true", help="ignore and overwrite an existing output file")
+    args = parser.parse_args(argv)
+    stats = run(args.input_dir, args.output, args.workers, args.llm_concurrency, resume=not args.no_resume)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""Offline benchmark of the extraction + analysis pipeline.
+
+Runs every format path end to end against the fixtures in uploads/ plus
+synthetic scaled-up inputs (large workbook, many-page PDF, big deck), with the
+deterministic stub LLM. Reports wall time, CPU time and peak RSS per stage
+(parse, ocr, mask, profile, prompt, llm).
+
+    python bench_pipeline.py [--stub-latency 0.2] [--scale 1.0] [--no-synthetic]
+                             [--save-baseline bench_baseline.json]
+                             [--baseline bench_baseline.json] [--tolerance 0.25]
+
+With --baseline, any stage whose wall time grew by more than the tolerance is
+flagged and the exit status is 1.
+
+CPU time is this process only; OCR runs in pool processes and shows up as wall time.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Offline, deterministic and uncached before any pipeline module is imported
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["IMAGE_REUSE"] = "0"
+os.environ["TEXT_REUSE"] = "off"
+os.environ["UNIT_REUSE"] = "0"
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(HERE, "uploads")
+FIXTURES = {
+    "File_002.png": "Image",
+    "File_004.png": "Image",
+    "File_007.png": "Image",
+    "File_009.png": "Image",
+    "File_011.png": "Image",
+    "File_008.xlsx": "Excel",
+    "File_012.pdf": "PDF",
+    "File_014.pptx": "PPT",
+}
+# "profile" is the Excel prompt text: column profiles for large sheets, masked rows for small ones
+STAGES = ("parse", "ocr", "mask", "profile", "prompt", "llm")
+
+
+# ------------------- Measurement -------------------
+def _rss_bytes():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Stage:
+    """Context manager timing one stage: wall, CPU and sampled peak RSS."""
+
+    def __init__(self, results, name, interval=0.005):
+        self.results = results
+        self.name = name
+        self.interval = interval
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = _rss_bytes()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    def __enter__(self):
+        self.peak = _rss_bytes() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes() or 0)
+        entry = self.results.setdefault(self.name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0})
+        entry["wall_s"] = round(entry["wall_s"] + wall, 4)
+        entry["cpu_s"] = round(entry["cpu_s"] + cpu, 4)
+        entry["peak_rss_mb"] = round(max(entry["peak_rss_mb"], self.peak / 1024 / 1024), 1)
+
+
+# ------------------- Format paths -------------------
+def run_pdf(path, results):
+    from new_pdf import extract_pdf_pages, classify_page, mask_pii
+    from ocr import ocr_pdf_pages
+    from prompt_builder import build_content
+    from ai import file_description_and_keyfindings
+
+    with Stage(results, "parse"):
+        pages = extract_pdf_pages(path, mode="never")
+        ocr_pages = [p["page"] for p in pages if classify_page(p["text"], p["images"])[0] == "ocr"]
+    with Stage(results, "ocr"):
+        ocr_results = ocr_pdf_pages(path, ocr_pages) if ocr_pages else {}
+    text = "\n".join(ocr_results.get(p["page"]) or p["text"] for p in pages)
+    with Stage(results, "mask"):
+        masked = mask_pii(text)
+    with Stage(results, "prompt"):
+        content = build_content(masked, "pdf")
+    with Stage(results, "llm"):
+        file_description_and_keyfindings(content)
+
+
+def run_ppt(path, results):
+    from pptx import Presentation
+    from ppt import iter_slide_text, mask_slide_text, ocr_ppt_images
+    from prompt_builder import build_content
+    from ai import file_description_and_keyfindings
+
+    with Stage(results, "parse"):
+        prs = Presentation(path)
+        items = [item for slide in prs.slides for item in iter_slide_text(slide)]
+    with Stage(results, "ocr"):
+        ocr_texts = ocr_ppt_images(prs)  # masked
+    with Stage(results, "mask"):
+        text = "\n".join(mask_slide_text(item) for item in items)
+        text += "\n" + "\n".join(t for t in ocr_texts if t.strip())
+    with Stage(results, "prompt"):
+        content = build_content(text, "ppt")
+    with Stage(results, "llm"):
+        file_description_and_keyfindings(content)
+
+
+def run_excel(path, results):
+    from excel import iter_sheet_chunks, summarize_sheets
+    from prompt_builder import build_content
+    from ai import file_description_and_keyfindings
+
+    with Stage(results, "parse"):
+        chunks = list(iter_sheet_chunks(path, mask=False))
+    # As summarize_excel_file() runs it in production (EXCEL_PROMPT_MODE, default "auto")
+    with Stage(results, "profile"):
+        text = summarize_sheets(chunks)
+    with Stage(results, "prompt"):
+        content = build_content(text, "excel")
+    with Stage(results, "llm"):
+        file_description_and_keyfindings(content)
+
+
+def run_image(path, results):
+    import image
+    from ai import get_model, describe_and_find
+
+    with Stage(results, "parse"):
+        img, _, _ = image.preprocess_image(path)
+    with Stage(results, "llm"):
+        describe_and_find(get_model(), ["Describe this image.", img])
+
+
+RUNNERS = {"PDF": run_pdf, "PPT": run_ppt, "Excel": run_excel, "Image": run_image}
+
+
+# ------------------- Synthetic inputs -------------------
+def make_workbook(path, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for sheet in range(2):
+        ws = wb.create_sheet(f"AccessLog{sheet + 1}")
+        ws.append(["Timestamp", "User", "Email", "Badge", "Door", "Result", "Source IP"])
+        for i in range(rows // 2):
+            ws.append([
+                f"2025-09-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}:00",
+                f"EMP{10000 + i % 900}",
+                f"user{i % 900}@example.com",
+                f"HT-{1000 + i % 300}-ABC",
+                f"Door {i % 12}",
+                "GRANTED" if i % 17 else "DENIED",
+                f"10.0.{i % 256}.{i % 200}",
+            ])
+    wb.save(path)
+
+
+def make_pdf(path, copies):
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(os.path.join(FIXTURE_DIR, "File_012.pdf"))
+    writer = PdfWriter()
+    for _ in range(copies):
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def make_deck(path, slides):
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    prs = Presentation()
+    logo = os.path.join(FIXTURE_DIR, "File_009.png")
+    diagram = os.path.join(FIXTURE_DIR, "File_011.png")
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = f"Network Security Review {i + 1}"
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(6), Inches(2)).text_frame
+        box.text = f"Owner: Sarah Thompson, s.thompson@example.com, +1 415-555-{i % 10000:04d}"
+        slide.shapes.add_picture(logo, Inches(8), Inches(0.2), Inches(1))  # repeated on every slide
+        if i % 5 == 0:
+            slide.shapes.add_picture(diagram, Inches(0.5), Inches(3.5), Inches(4))
+    prs.save(path)
+
+
+def synthetic_inputs(tmp_dir, scale):
+    rows, pdf_copies, slides = int(100000 * scale), max(1, int(20 * scale)), max(1, int(60 * scale))
+    specs = [
+        (f"synthetic_{rows}_rows.xlsx", "Excel", make_workbook, rows),
+        (f"synthetic_{pdf_copies}x_File_012.pdf", "PDF", make_pdf, pdf_copies),
+        (f"synthetic_{slides}_slides.pptx", "PPT", make_deck, slides),
+    ]
+    inputs = []
+    for name, file_type, make, size in specs:
+        path = os.path.join(tmp_dir, name)
+        print(f"Generating {name} ...", flush=True)
+        make(path, size)
+        inputs.append((name, file_type, path))
+    return inputs
+
+
+# ------------------- Reporting -------------------
+def print_table(report):
+    print(f"\n{'input':<34}{'stage':<8}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}")
+    for name, entry in report["inputs"].items():
+        for stage in STAGES:
+            if stage in entry["stages"]:
+                s = entry["stages"][stage]
+                print(f"{name:<34}{stage:<8}{s['wall_s']:>9.3f}{s['cpu_s']:>9.3f}{s['peak_rss_mb']:>9.1f}")
+        if "error" in entry:
+            print(f"{name:<34}ERROR   {entry['error']}")
+
+
+def compare(report, baseline, tolerance, min_seconds=0.05):
+    """Stages whose wall time regressed by more than tolerance versus the baseline."""
+    regressions = []
+    for name, entry in report["inputs"].items():
+        base_entry = baseline.get("inputs", {}).get(name)
+        if not base_entry:
+            continue
+        for stage, s in entry["stages"].items():
+            base = base_entry["stages"].get(stage)
+            if base and s["wall_s"] > max(base["wall_s"] * (1 + tolerance), base["wall_s"] + min_seconds):
+                regressions.append((name, stage, base["wall_s"], s["wall_s"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--scale", type=float, default=1.0, help="size multiplier for synthetic inputs")
+    parser.add_argument("--no-synthetic", action="store_true")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    os.environ["STUB_LLM_LATENCY"] = str(args.stub_latency)
+    sys.path.insert(0, HERE)
+    import llm_stub
+    llm_stub.STUB_LLM_LATENCY = args.stub_latency
+
+    inputs = [(name, ftype, os.path.join(FIXTURE_DIR, name)) for name, ftype in FIXTURES.items()]
+    tmp_dir = tempfile.mkdtemp(prefix="bench_")
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stub_latency": args.stub_latency,
+        "scale": args.scale,
+        "inputs": {},
+    }
+    try:
+        if not args.no_synthetic:
+            inputs += synthetic_inputs(tmp_dir, args.scale)
+        for name, file_type, path in inputs:
+            print(f"Running {name} ({file_type}) ...", flush=True)
+            stages = {}
+            entry = {"file_type": file_type, "bytes": os.path.getsize(path), "stages": stages}
+            try:
+                RUNNERS[file_type](path, stages)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+            entry["total_wall_s"] = round(sum(s["wall_s"] for s in stages.values()), 4)
+            report["inputs"][name] = entry
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print_table(report)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} slower):")
+            for name, stage, before, after in regressions:
+                print(f"  {name} {stage}: {before:.3f}s -> {after:.3f}s")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from telemetry import record_error
+
+# ------------------- Configuration -------------------
+CACHE_DB_PATH = os.environ.get(
+    "RESULT_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_cache.sqlite3")
+)
+CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MEMORY_ENTRIES = int(os.environ.get("RESULT_CACHE_MEMORY_ENTRIES", 256))
+CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 64 * 1024 * 1024))
+
+
+# ------------------- Keys -------------------
+def make_key(content_hash: str, file_type: str, version: str) -> str:
+    """Cache key: content hash + file type + prompt/model version."""
+    return f"{content_hash}:{file_type}:{version}"
+
+
+# ------------------- Cache -------------------
+class ResultCache:
+    """Two-tier (memory LRU + SQLite) cache of (description, findings) results."""
+
+    def __init__(self, db_path=CACHE_DB_PATH, ttl=CACHE_TTL_SECONDS,
+                 memory_entries=CACHE_MEMORY_ENTRIES, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                       key TEXT PRIMARY KEY,
+                       value TEXT NOT NULL,
+                       size INTEGER NOT NULL,
+                       created REAL NOT NULL,
+                       accessed REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed)")
+
+    def get(self, key: str):
+        """Return the cached value for key, or None if missing/expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                value, created = json.loads(row[0]), row[1]
+                if now - created > self.ttl:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            record_error("cache", e)
+            return None
+
+        self._remember(key, created, value)
+        return value
+
+    def set(self, key: str, value):
+        """Store a JSON-serialisable value in both tiers."""
+        now = time.time()
+        self._remember(key, now, value)
+        payload = json.dumps(value)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                self._evict_disk(conn, now)
+        except sqlite3.Error as e:
+            record_error("cache", e)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            record_error("cache", e)
+
+    def invalidate_hash(self, content_hash: str):
+        """Drop every entry for a file, whatever its type/version."""
+        prefix = f"{content_hash}:"
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefix)]:
+                del self._memory[key]
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        except sqlite3.Error as e:
+            record_error("cache", e)
+
+    def _remember(self, key, created, value):
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self, conn, now):
+        conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        # Least recently accessed first until we are back under budget
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed ASC").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+
+result_cache = ResultCache()
@@ -0,0 +1,116 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from telemetry import log_event, PARTIAL_RESULTS
+
+# ------------------- Configuration -------------------
+# Wall-clock budget for analyzing one file, in seconds (0 = no deadline); ?budget= can only lower it
+REQUEST_BUDGET_SECONDS = float(os.environ.get("REQUEST_BUDGET_SECONDS", 120))
+# Share of the budget that extraction, OCR and chunk summaries leave for the description/findings calls
+DEADLINE_LLM_RESERVE = float(os.environ.get("DEADLINE_LLM_RESERVE", 0.25))
+
+# Deadline of the request being handled; flows into worker threads via contextvars
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a stage cannot start or finish within the request's budget."""
+
+
+# ------------------- Deadline -------------------
+class Deadline:
+    """A request's time budget, and the stages that were cut short to meet it."""
+
+    def __init__(self, seconds: float, reserve: float = DEADLINE_LLM_RESERVE):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self.reserve = seconds * reserve
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def extraction_remaining(self) -> float:
+        """Time left for work that has to leave the reserve to the final model calls."""
+        return max(0.0, self.expires - self.reserve - time.monotonic())
+
+    def mark_partial(self, stage: str, **fields):
+        with self._lock:
+            self.skipped.append({"stage": stage, **fields})
+        PARTIAL_RESULTS.inc(stage=stage)
+        log_event(logging.WARNING, "deadline_partial", stage=stage, **fields)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.skipped)
+
+
+@contextmanager
+def deadline_scope(seconds=REQUEST_BUDGET_SECONDS):
+    """Run the block under a fresh budget of seconds (0/None: none); yields the Deadline or None."""
+    deadline = Deadline(seconds) if seconds else None
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def request_budget(args) -> float:
+    """Per-request budget: ?budget=SECONDS, capped at REQUEST_BUDGET_SECONDS when that is set."""
+    try:
+        budget = float(args.get("budget", 0))
+    except (TypeError, ValueError):
+        budget = 0
+    if budget <= 0:
+        return REQUEST_BUDGET_SECONDS
+    return min(budget, REQUEST_BUDGET_SECONDS) if REQUEST_BUDGET_SECONDS else budget
+
+
+# ------------------- Checks -------------------
+def current_deadline():
+    return _deadline.get()
+
+
+def remaining():
+    """Seconds left in the request's budget, or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def extraction_time_left():
+    """Seconds extraction/OCR/summarizing may still use, or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.extraction_remaining()
+
+
+def out_of_extraction_time() -> bool:
+    left = extraction_time_left()
+    return left is not None and left <= 0
+
+
+def call_timeout(timeout):
+    """A model call's timeout, capped by the time left; raises BudgetExceeded when none is."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise BudgetExceeded("Request budget exhausted")
+    return min(timeout, left) if timeout else left
+
+
+def mark_partial(stage: str, **fields):
+    """Record that a stage was cut short for the deadline (no-op outside a deadline)."""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.mark_partial(stage, **fields)
+
+
+def is_partial() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and deadline.partial
@@ -1,31 +1,364 @@
 from ai import file_description_and_keyfindings
 import os
+import io
+from itertools import chain, islice, groupby
+import numpy as np
 import pandas as pd
-import re
+from openpyxl import load_workbook
 import warnings
+from masking import mask_text, mask_series
+from prompt_builder import build_content
+from deadline import out_of_extraction_time, mark_partial
+from telemetry import span, record_error
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-pii_patterns = {
-    "EMPLOYEE_ID": r'\bEMP\d+\b',                        
-    "EMAIL": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-    "TOKEN_SERIAL": r'\bHT-\d+-[A-Z]+\b',                
-    "FULL_NAME": r'\b(?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b|\b[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b',
-    "CREDIT_CARD": r"\b(?:\d[ -]*?){13,16}\b",
-}
+# "stream": every sheet, read in row chunks and masked column-wise (default)
+# "frame": first sheet only, loaded whole and masked cell by cell (legacy)
+EXCEL_INGEST_MODE = os.environ.get("EXCEL_INGEST_MODE", "stream")
+EXCEL_CHUNK_ROWS = int(os.environ.get("EXCEL_CHUNK_ROWS", 5000))
+
+# What the prompt gets per sheet: "rows" (every masked row), "profile" (per-column
+# statistics plus a stratified row sample) or "auto" (profile sheets with more than
+# EXCEL_PROFILE_MIN_ROWS rows, send smaller ones as rows)
+EXCEL_PROMPT_MODE = os.environ.get("EXCEL_PROMPT_MODE", "auto")
+EXCEL_PROFILE_MIN_ROWS = int(os.environ.get("EXCEL_PROFILE_MIN_ROWS", 500))
+EXCEL_PROFILE_TOP_K = int(os.environ.get("EXCEL_PROFILE_TOP_K", 5))
+EXCEL_PROFILE_SAMPLE_ROWS = int(os.environ.get("EXCEL_PROFILE_SAMPLE_ROWS", 20))
+# Distinct values counted per column; past this only the most frequent are kept (counts become approximate)
+EXCEL_PROFILE_MAX_DISTINCT = int(os.environ.get("EXCEL_PROFILE_MAX_DISTINCT", 10000))
+# A column can stratify the sample if its first chunk has 2 to this many distinct values
+EXCEL_PROFILE_MAX_STRATA = 12
+NUMERIC_KINDS = {"integer", "floating", "mixed-integer-float", "decimal"}
+DATE_KINDS = {"datetime", "datetime64", "date"}
+# Text cells that read as timestamps ("2024-03-01 09:14", "03/01/2024", "1 Mar 2024"...);
+# a text column is profiled as dates when nearly all of a chunk's values do
+TEXT_DATE_PATTERN = (
+    r"^\s*(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}"
+    r"|\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4}|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4})"
+)
+TEXT_DATE_MIN_SHARE = 0.9
 
 def mask_pii(text: str) -> str:
     if not isinstance(text,str):
         text = str(text) if pd.notna(text) else ""
-    modified_text = text
-    for label, pattern in pii_patterns.items():
-        modified_text = re.sub(pattern, f"<{label}>", modified_text, flags=re.IGNORECASE)
-    return modified_text
+    return mask_text(text, "excel")
+
+def mask_frame(df):
+    """Mask every column of a chunk at once; empty cells become ""."""
+    for col in df.columns:
+        values = df[col]
+        df[col] = mask_series(values.where(values.notna(), "").astype(str), "excel")
+    return df
+
+def _header_names(header_row):
+    """Column names as pandas would give them: blanks unnamed, duplicates suffixed."""
+    names, seen = [], {}
+    for i, value in enumerate(header_row):
+        name = str(value) if value is not None else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
 
-def process_excel_file(file_path: str) -> str:
-    """Read Excel, mask PII, save masked Excel as 'clean.xlsx', return file path."""
+def iter_sheet_chunks(file_path: str, chunk_rows: int = EXCEL_CHUNK_ROWS, mask: bool = True):
+    """Yield (sheet_name, masked DataFrame) chunks of at most chunk_rows rows per sheet.
+
+    Stops early (flagging the result partial) when the request's deadline leaves no time for more.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(file_path, engine="openpyxl", dtype=str)
-        df_masked = df.applymap(mask_pii)
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if header_row is None:
+                continue
+            columns = _header_names(header_row)
+            width = len(columns)
+            # Drop blank rows and pad/trim ragged ones to the header width
+            rows = (
+                tuple(row[:width]) + (None,) * (width - len(row))
+                for row in rows
+                if any(value is not None for value in row)
+            )
+            while True:
+                if out_of_extraction_time():
+                    mark_partial("excel", sheet=ws.title)
+                    return
+                batch = list(islice(rows, chunk_rows))
+                if not batch:
+                    break
+                chunk = pd.DataFrame(batch, columns=columns, dtype=object)
+                if mask:
+                    with span("mask", rows=len(chunk)):
+                        chunk = mask_frame(chunk)
+                yield ws.title, chunk
+    finally:
+        wb.close()
+
+def stream_excel_file(file_path: str, chunk_rows: int = EXCEL_CHUNK_ROWS) -> str:
+    """Read all sheets in bounded row chunks, mask PII, return the rendered text."""
+    out = io.StringIO()
+    current_sheet = None
+    for sheet_name, chunk in iter_sheet_chunks(file_path, chunk_rows):
+        first_chunk = sheet_name != current_sheet
+        if first_chunk:
+            if current_sheet is not None:
+                out.write("\n\n")
+            out.write(f"Sheet: {sheet_name}\n")
+            current_sheet = sheet_name
+        else:
+            out.write("\n")
+        out.write(chunk.to_string(index=False, header=first_chunk))
+    return out.getvalue()
+
+class ColumnProfile:
+    """Running statistics for one column, updated a chunk at a time with vectorized pandas ops."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.kinds = set()
+        self.counts = pd.Series(dtype="float64")
+        self.truncated = False
+        self.range_kind = None
+        self.low = self.high = None
+        self.total = 0.0
+        self.numbers = 0
+        self.text_dates = True  # until a chunk of the column shows otherwise
+
+    def _parse_text_dates(self, present):
+        """Timestamps from a text chunk exported as strings, or None if it is not such a column."""
+        if not self.text_dates:
+            return None
+        text = present.astype(str)
+        if text.str.match(TEXT_DATE_PATTERN).mean() < TEXT_DATE_MIN_SHARE:
+            self.text_dates = False
+            return None
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            dates = pd.to_datetime(text, errors="coerce", format="mixed")
+        if dates.notna().mean() < TEXT_DATE_MIN_SHARE:
+            self.text_dates = False
+            return None
+        return dates.dropna()
+
+    def update(self, values):
+        self.rows += len(values)
+        present = values[values.notna() & (values.astype(str).str.strip() != "")]
+        self.nulls += len(values) - len(present)
+        if present.empty:
+            return
+        kind = pd.api.types.infer_dtype(present, skipna=True)
+        text_dates = self._parse_text_dates(present) if kind == "string" else None
+        if text_dates is not None:
+            kind = "datetime"
+            if not text_dates.empty:
+                self._extend_range("date", text_dates.min(), text_dates.max())
+        self.kinds.add(kind)
+        if kind in NUMERIC_KINDS:
+            numbers = pd.to_numeric(present, errors="coerce").dropna()
+            if not numbers.empty:
+                self._extend_range("number", numbers.min(), numbers.max())
+                self.total += float(numbers.sum())
+                self.numbers += len(numbers)
+        elif kind in DATE_KINDS and text_dates is None:
+            dates = pd.to_datetime(present, errors="coerce").dropna()
+            if not dates.empty:
+                self._extend_range("date", dates.min(), dates.max())
+        self.counts = self.counts.add(present.astype(str).value_counts(), fill_value=0)
+        if len(self.counts) > EXCEL_PROFILE_MAX_DISTINCT:
+            self.counts = self.counts.nlargest(EXCEL_PROFILE_MAX_DISTINCT)
+            self.truncated = True
+
+    def _extend_range(self, range_kind, low, high):
+        if self.range_kind is None:
+            self.range_kind, self.low, self.high = range_kind, low, high
+        elif self.range_kind == range_kind:
+            self.low, self.high = min(self.low, low), max(self.high, high)
+        else:
+            self.range_kind = "mixed"
+
+    @property
+    def kind(self):
+        if not self.kinds:
+            return "empty"
+        if self.kinds <= {"integer"}:
+            return "integer"
+        if self.kinds <= NUMERIC_KINDS:
+            return "number"
+        if self.kinds <= DATE_KINDS:
+            return "date/time"
+        if self.kinds <= {"string"}:
+            return "text"
+        if self.kinds <= {"boolean"}:
+            return "boolean"
+        return "mixed"
+
+    def describe(self, top_k: int = EXCEL_PROFILE_TOP_K) -> str:
+        """One masked line: type, empty rate, cardinality, range/mean and the most common values."""
+        parts = [
+            self.kind,
+            f"{self.nulls / self.rows:.0%} empty" if self.rows else "no rows",
+            f"{len(self.counts):,}{'+' if self.truncated else ''} distinct",
+        ]
+        if self.range_kind in ("number", "date"):
+            parts.append(f"range {mask_pii(self.low)} .. {mask_pii(self.high)}")
+        if self.numbers:
+            parts.append(f"mean {self.total / self.numbers:,.2f}")
+        # Count by masked value, so e.g. a column of employee IDs reads "<EMPLOYEE_ID> (20,000)"
+        masked = mask_series(pd.Series(self.counts.index, dtype=object), "excel")
+        top = self.counts.groupby(masked.to_numpy()).sum().nlargest(top_k)
+        if not top.empty and top.iloc[0] > 1:
+            parts.append("top: " + ", ".join(f"{value[:40]} ({int(count):,})" for value, count in top.items()))
+        return f"- {self.name}: " + "; ".join(parts)
+
+
+class StratifiedSample:
+    """Uniform random rows per stratum (bottom-k on random keys), bounded in memory.
+
+    The stratum column is the one with the fewest (2..EXCEL_PROFILE_MAX_STRATA) distinct
+    values in the first chunk, so rare categories such as DENIED rows show up; without
+    one the sample is a plain random sample of the whole sheet.
+    """
+
+    def __init__(self, size: int = EXCEL_PROFILE_SAMPLE_ROWS, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)  # fixed: the same sheet gives the same prompt
+        self.column = None
+        self.strata = None
+        self.frame = None
+
+    def _choose_column(self, chunk):
+        best = None
+        for col in chunk.columns:
+            distinct = chunk[col].nunique(dropna=True)
+            if 2 <= distinct <= EXCEL_PROFILE_MAX_STRATA and (best is None or distinct < best[0]):
+                best = (distinct, col)
+        if best is not None:
+            self.column = best[1]
+            self.strata = set(chunk[self.column].dropna().astype(str))
+
+    def update(self, chunk):
+        if self.frame is None:
+            self._choose_column(chunk)
+        keyed = chunk.assign(_key=self.rng.random(len(chunk)))
+        if self.column is not None:
+            stratum = chunk[self.column].astype(str)
+            keyed["_stratum"] = stratum.where(stratum.isin(self.strata), "(other)")
+        else:
+            keyed["_stratum"] = ""
+        frame = keyed if self.frame is None else pd.concat([self.frame, keyed], ignore_index=True)
+        self.frame = frame.sort_values("_key").groupby("_stratum", sort=False).head(self.size)
+
+    def rows(self):
+        """The sample, taking strata in turn so each is represented."""
+        if self.frame is None:
+            return None
+        frame = self.frame.sort_values("_key")
+        frame = frame.assign(_rank=frame.groupby("_stratum", sort=False).cumcount())
+        return frame.sort_values(["_rank", "_key"]).head(self.size).drop(columns=["_key", "_stratum", "_rank"])
+
+
+def profile_sheet(sheet_name, chunks) -> str:
+    """Column profile and stratified sample of a sheet's (unmasked) chunks; values are masked, headers kept."""
+    profiles = None
+    sample = StratifiedSample()
+    rows = 0
+    for chunk in chunks:
+        if profiles is None:
+            profiles = [ColumnProfile(col) for col in chunk.columns]
+        for profile in profiles:
+            profile.update(chunk[profile.name])
+        sample.update(chunk)
+        rows += len(chunk)
+
+    lines = [
+        f"Sheet: {sheet_name}",
+        f"Column profile of all {rows:,} rows x {len(profiles)} columns "
+        "(statistics per column, values masked, counts in parentheses):",
+    ]
+    lines += [profile.describe() for profile in profiles]
+    sample_rows = sample.rows()
+    if sample_rows is not None and not sample_rows.empty:
+        how = f"stratified by {sample.column}" if sample.column is not None else "random"
+        sample_rows = mask_frame(sample_rows.copy())
+        lines.append(f"Sample of {len(sample_rows)} rows ({how}):")
+        lines.append(sample_rows.to_string(index=False))
+    return "\n".join(lines)
+
+
+def render_sheet_rows(sheet_name, chunks) -> str:
+    """Every row of a sheet's (unmasked) chunks, masked, as stream_excel_file renders them."""
+    parts = [f"Sheet: {sheet_name}"]
+    for i, chunk in enumerate(chunks):
+        with span("mask", rows=len(chunk)):
+            chunk = mask_frame(chunk)
+        parts.append(chunk.to_string(index=False, header=i == 0))
+    return "\n".join(parts)
+
+
+def summarize_excel_file(file_path: str, prompt_mode: str = EXCEL_PROMPT_MODE,
+                         min_rows: int = EXCEL_PROFILE_MIN_ROWS, chunk_rows: int = EXCEL_CHUNK_ROWS) -> str:
+    """Prompt text for every sheet: a profile for large sheets (or all, in "profile" mode), rows otherwise."""
+    return summarize_sheets(iter_sheet_chunks(file_path, chunk_rows, mask=False), prompt_mode, min_rows)
+
+
+def summarize_sheets(chunks, prompt_mode: str = EXCEL_PROMPT_MODE, min_rows: int = EXCEL_PROFILE_MIN_ROWS) -> str:
+    """summarize_excel_file() over (sheet_name, unmasked chunk) pairs as iter_sheet_chunks yields them."""
+    sheets = []
+    for sheet_name, sheet_chunks in groupby(chunks, key=lambda item: item[0]):
+        sheet_chunks = (chunk for _, chunk in sheet_chunks)
+        # Buffer rows until the sheet is known to be large enough to profile
+        buffered, rows = [], 0
+        if prompt_mode != "profile":
+            for chunk in sheet_chunks:
+                buffered.append(chunk)
+                rows += len(chunk)
+                if rows > min_rows:
+                    break
+            else:
+                sheets.append(render_sheet_rows(sheet_name, buffered))
+                continue
+        with span("profile"):
+            sheets.append(profile_sheet(sheet_name, chain(buffered, sheet_chunks)))
+    return "\n\n".join(sheets)
+
+
+def process_excel_file(file_path: str, mode: str = EXCEL_INGEST_MODE,
+                       prompt_mode: str = EXCEL_PROMPT_MODE) -> str:
+    """Masked text of a workbook for the prompt ("" if it cannot be read).
+
+    In "stream" mode every sheet is read in row chunks. With prompt_mode "rows"
+    each chunk is masked column-wise and rendered (stream_excel_file). Otherwise
+    sheets over EXCEL_PROFILE_MIN_ROWS rows (every sheet in "profile" mode) are
+    summarized by profile_sheet: per-column statistics and a stratified row
+    sample with their values masked but the column headers left as they are, so
+    "Source IP" does not become a FULL_NAME; smaller sheets are rendered as rows.
+    "frame" mode masks the first sheet cell by cell (legacy).
+    """
+    if mode == "stream" and prompt_mode != "rows":
+        try:
+            with span("extract"):
+                return summarize_excel_file(file_path, prompt_mode)
+        except Exception as e:
+            record_error("excel", e)
+            return ""
+    if mode == "stream":
+        try:
+            with span("extract"):
+                return stream_excel_file(file_path)
+        except Exception as e:
+            record_error("excel", e)
+            return ""
+    try:
+        with span("extract"):
+            df = pd.read_excel(file_path, engine="openpyxl", dtype=str)
+        with span("mask", rows=len(df)):
+            df_masked = df.applymap(mask_pii)
         '''
         output_file = "clean.xlsx"
         df_masked.to_excel(output_file, index=False, engine="openpyxl")
@@ -35,13 +368,13 @@ def process_excel_file(file_path: str) -> str:
         cleansed_text = df_masked.to_string(index=False, header=True)
         return cleansed_text
     except Exception as e:
-        print(f"Error processing file: {e}")
+        record_error("excel", e)
         return ""
 
-def excel_main(file_path:str):
-    cleansed_text = process_excel_file(file_path)
-    if cleansed_text:
-        prompt = f"""
+def build_excel_prompt(cleansed_text: str, cache_mode: str = "use", content_hash: str = None) -> str:
+    """Budget the masked sheet text and wrap it in the spreadsheet prompt."""
+    cleansed_text = build_content(cleansed_text, "excel", cache_mode=cache_mode, content_hash=content_hash)
+    return f"""
         Analyze the following cleansed spreadsheet data (Excel file). Generate a descriptive 
         title and a file caption of about 30 words that summarizes the data's content, 
         focusing on the security/IT-related context (e.g., Firewall rules, User Access Log, 
@@ -50,9 +383,12 @@ def excel_main(file_path:str):
         ---
         {cleansed_text}
         """
+
+def excel_main(file_path:str):
+    cleansed_text = process_excel_file(file_path)
+    if cleansed_text:
+        prompt = build_excel_prompt(cleansed_text)
         file_description,key_findings = file_description_and_keyfindings(prompt)
         return file_description,key_findings
     else:
         return "Failed to process the Excel file."
-
-
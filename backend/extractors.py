@@ -0,0 +1,187 @@
+import importlib
+import io
+import logging
+import os
+import threading
+import time
+import zipfile
+
+from telemetry import log_event
+
+# ------------------- Configuration -------------------
+# Extractors imported in the background at startup: "" (none), "all", or e.g. "PDF,Image"
+EXTRACTOR_WARMUP = os.environ.get("EXTRACTOR_WARMUP", "")
+
+# Bytes read from the start of an upload for sniffing
+SNIFF_BYTES = 2048
+
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # legacy .xls / .ppt container
+ZIP_MAGIC = b"PK\x03\x04"  # OOXML .xlsx / .pptx container
+
+
+# ------------------- Registry -------------------
+class Extractor:
+    """A file type's entry points, imported from its module on first use.
+
+    function runs the whole pipeline for a file; text_function/prompt_function
+    split it into extraction (masked text) and prompt building, for callers that
+    run the model call themselves (None for images, which have no text stage).
+    Both follow the request's cache mode for what they keep in the unit store
+    (unit_store.py): prompt building for chunk summaries, text extraction for
+    pages and slides where stores_units is set.
+    """
+
+    def __init__(self, file_type, module, function, extensions, masking_profile=None, takes_stats=False,
+                 text_function=None, prompt_function=None, stores_units=False):
+        self.file_type = file_type
+        self.module = module
+        self.function = function
+        self.extensions = set(extensions)
+        self.masking_profile = masking_profile
+        self.takes_stats = takes_stats
+        self.text_function = text_function
+        self.prompt_function = prompt_function
+        self.stores_units = stores_units
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the module (once) and return it."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.module)
+                    log_event(
+                        logging.INFO, "extractor_loaded", extractor=self.file_type,
+                        seconds=round(time.perf_counter() - start, 3),
+                    )
+                    self._module = module
+        return self._module
+
+    def _call(self, name, source, stats, **options):
+        func = getattr(self.load(), name)
+        if self.takes_stats:
+            return func(source, stats, **options)
+        return func(source, **options)
+
+    def run(self, source, stats=None, **options):
+        return self._call(self.function, source, stats, **options)
+
+    def extract_text(self, source, stats=None, mode="use", content_hash=None) -> str:
+        if self.stores_units:
+            return self._call(self.text_function, source, stats, cache_mode=mode, content_hash=content_hash)
+        return self._call(self.text_function, source, stats)
+
+    def build_prompt(self, text: str, mode="use", content_hash=None) -> str:
+        return getattr(self.load(), self.prompt_function)(text, cache_mode=mode, content_hash=content_hash)
+
+    def warm_up(self):
+        """Import the module and build its masking engine ahead of the first request."""
+        self.load()
+        if self.masking_profile:
+            from masking import get_engine
+            get_engine(self.masking_profile)
+
+
+EXTRACTORS = {}
+
+
+def register_extractor(extractor: Extractor):
+    EXTRACTORS[extractor.file_type] = extractor
+
+
+register_extractor(Extractor(
+    "PDF", "new_pdf", "pdf_main", {"pdf"}, masking_profile="pdf", takes_stats=True,
+    text_function="extract_text_from_pdf", prompt_function="build_pdf_prompt", stores_units=True,
+))
+register_extractor(Extractor(
+    "PPT", "ppt", "ppt_main", {"ppt", "pptx"}, masking_profile="ppt", takes_stats=True,
+    text_function="extract_text_from_ppt", prompt_function="build_ppt_prompt", stores_units=True,
+))
+register_extractor(Extractor(
+    "Excel", "excel", "excel_main", {"xls", "xlsx"}, masking_profile="excel",
+    text_function="process_excel_file", prompt_function="build_excel_prompt",
+))
+register_extractor(Extractor(
+    "Image", "image", "image_file_description_and_keyfindings", {"jpg", "png"}, takes_stats=True
+))
+
+
+def get_extractor(file_type: str) -> Extractor:
+    return EXTRACTORS[file_type]
+
+
+def type_for_extension(ext: str):
+    ext = ext.lower()
+    for extractor in EXTRACTORS.values():
+        if ext in extractor.extensions:
+            return extractor.file_type
+    return None
+
+
+# ------------------- Sniffing -------------------
+def _read_head(source, size=SNIFF_BYTES) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(size)
+    position = source.tell()
+    try:
+        return source.read(size)
+    finally:
+        source.seek(position)
+
+
+def _ooxml_type(source):
+    """Excel or PPT for an OOXML zip, by its top-level part folder."""
+    try:
+        with zipfile.ZipFile(source) as archive:
+            names = archive.namelist()
+    except (zipfile.BadZipFile, OSError):
+        return None
+    finally:
+        if isinstance(source, io.IOBase):
+            source.seek(0)
+    if any(name.startswith("xl/") for name in names):
+        return "Excel"
+    if any(name.startswith("ppt/") for name in names):
+        return "PPT"
+    return None
+
+
+def sniff_file_type(source, ext: str = ""):
+    """File type from the content's magic bytes (a path or seekable binary stream), or None.
+
+    The extension only breaks the tie for legacy OLE2 files, which may be .xls or .ppt.
+    """
+    head = _read_head(source)
+    if b"%PDF-" in head[:1024]:
+        return "PDF"
+    if head.startswith(b"\x89PNG\r\n\x1a\n") or head.startswith(b"\xff\xd8\xff"):
+        return "Image"
+    if head.startswith(ZIP_MAGIC):
+        return _ooxml_type(source)
+    if head.startswith(OLE2_MAGIC):
+        file_type = type_for_extension(ext)
+        return file_type if file_type in ("Excel", "PPT") else None
+    return None
+
+
+# ------------------- Warm-up -------------------
+def warm_up(file_types=None):
+    """Load the given extractors (default: all); failures are logged, not raised."""
+    for file_type in file_types or list(EXTRACTORS):
+        try:
+            get_extractor(file_type).warm_up()
+        except Exception as e:
+            log_event(logging.WARNING, "extractor_warmup_failed", extractor=file_type, error=str(e))
+
+
+def start_warm_up(setting: str = EXTRACTOR_WARMUP):
+    """Warm the extractors named in EXTRACTOR_WARMUP on a background thread."""
+    if not setting:
+        return None
+    file_types = None if setting.lower() == "all" else [name.strip() for name in setting.split(",") if name.strip()]
+    thread = threading.Thread(target=warm_up, args=(file_types,), name="extractor-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -1,16 +1,71 @@
 import os
-import google.generativeai as genai
+import time
 import dotenv
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+from ai import get_model, describe_and_find, MODEL_NAME, PROMPT_VERSION, AI_RESPONSE_MODE
+from image_index import image_index, dhash
+from telemetry import span, CACHE_LOOKUPS
 
 dotenv.load_dotenv()
 
-def image_file_description_and_keyfindings(image_path: str) -> str:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    image = Image.open(image_path)
-    description_prompt = f"""
+# ------------------- Preprocessing -------------------
+IMAGE_MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", 1600))
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "JPEG")
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 85))
+# Set to 0 to always call the model even for near-identical photos
+IMAGE_REUSE = os.environ.get("IMAGE_REUSE", "1") != "0"
+INDEX_VERSION = f"{MODEL_NAME}:{PROMPT_VERSION}:{AI_RESPONSE_MODE}"
+
+def _source_size(source):
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer().nbytes
+    return os.path.getsize(source)
+
+def preprocess_image(source):
+    """Orient, downscale and re-encode an image; returns (image, image_hash, report).
+
+    The report has original/encoded byte counts and per-stage timings in ms.
+    """
+    timings = {}
+    start = time.perf_counter()
+    image = Image.open(source)
+    image = ImageOps.exif_transpose(image)  # phone photos carry rotation in EXIF
+    timings["orient_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    original_size = image.size
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+    timings["resize_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    encoded = io.BytesIO()
+    image.save(encoded, format=IMAGE_FORMAT, quality=IMAGE_QUALITY, optimize=True)
+    encoded.seek(0)
+    image = Image.open(encoded)
+    timings["encode_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    image_hash = dhash(image)
+    timings["hash_ms"] = (time.perf_counter() - start) * 1000
+
+    original_bytes = _source_size(source)
+    encoded_bytes = encoded.getbuffer().nbytes
+    report = {
+        "original_bytes": original_bytes,
+        "encoded_bytes": encoded_bytes,
+        "bytes_saved": max(0, original_bytes - encoded_bytes),
+        "original_dimensions": list(original_size),
+        "dimensions": list(image.size),
+        "perceptual_hash": f"{image_hash:016x}",
+        **{key: round(value, 2) for key, value in timings.items()},
+    }
+    return image, image_hash, report
+
+# Shared by the sync and async (async_app.py) paths
+DESCRIPTION_PROMPT = """
     You are a visual summarizer.
 
 Look at the image and write a short, clear, and factual description in **exactly two parts**:
@@ -50,71 +105,41 @@ Two entries are already filled in.
 
 """
 
-    response = model.generate_content([description_prompt,image])
-    
-    file_description = response.text
-
-    prompt = f"""
-    Analyze the following file description and extract the key findings. The findings should summarize the system's purpose, functionality, advantages, and potential vulnerabilities. Follow the format of the examples provided.
-    Don't include 'Key Findings' heading.
-    ---
-    **Example 1:**
-
-    **File Description:**
-    Access Card Reader
-
-    A person is holding an access card against a card reader mounted near a door labeled "211 IDF/Electrical." The card reader has a light indicator.
-
-    **Key Findings:**
-    - Digital access control system using ID/employee cards.
-    - Automates entry tracking by time-stamping when the card is swiped.
-    - Dependent on card validity and system integrity (e.g., cards can be lost or borrowed).
-
-    ---
-    **Example 2:**
-
-    **File Description:**
-    Biometric Attendance/Access System
+def prepare_image(image_path, stats: dict = None, mode: str = "use"):
+    """Preprocess and look the image up in the index: (image, image_hash, report, prior result or None).
 
-    A wall-mounted electronic biometric device with fingerprint scanning, keypad, and display screen showing time.
-
-    **Key Findings:**
-    - Uses biometric authentication (fingerprint) for high security.
-    - Eliminates risks of proxy entry or shared access (unlike cards or logbooks).
-    - Provides accurate, automated attendance and access logs.
-    - Suitable for organizations seeking reliable and tamper-proof entry systems.
-
-    ---
-    **Example 3:**
-
-    **File Description:**
-    Visitors Logbook
-
-    A paper-based visitor logbook where individuals manually write their name, reason for visit, time in/out, and provide a signature. Two entries are already filled in.
-
-    **Key Findings:**
-    - Manual entry system, dependent on handwriting.
-    - Prone to errors, illegible writing, and falsification.
-    - No automatic time tracking—relies on honesty and accuracy of the visitor.
-
-    ---
-    **New Request:**
-
-    **File Description:**
-    {file_description}
-
-    **Key Findings:**
+    Follows the request's cache mode: only "use" looks for a near-identical prior photo.
     """
-    
-    response = model.generate_content(prompt)
-    raw_findings = response.text.strip()
-    cleaned_findings_text = raw_findings.replace('\n-', '\n').replace('- ', '\n').replace('\n\n', '\n')
-    findings_list = [
-        item.strip()
-        for item in cleaned_findings_text.split('\n')
-        if item.strip()
-    ]
-    final_findings = "\n".join(f"- {finding}" for finding in findings_list)
-    
-    return file_description,final_findings
-
+    with span("extract"):
+        image, image_hash, report = preprocess_image(image_path)
+    if stats is not None:
+        stats["image"] = report
+
+    if IMAGE_REUSE and mode == "use":
+        match = image_index.lookup(image_hash, INDEX_VERSION)
+        CACHE_LOOKUPS.inc(cache="image", result="miss" if match is None else "hit")
+        if match is not None:
+            (file_description, final_findings), distance = match
+            report["reused"] = True
+            report["hash_distance"] = distance
+            return image, image_hash, report, (file_description, final_findings)
+    report["reused"] = False
+    return image, image_hash, report, None
+
+def remember_image(image_hash, file_description, final_findings, mode="use", content_hash=None):
+    """Index a fresh result (not on "bypass"); content_hash lets the upload's cache invalidation reach it."""
+    if IMAGE_REUSE and mode != "bypass" and file_description and final_findings:
+        image_index.add(image_hash, INDEX_VERSION, [file_description, final_findings], content_hash)
+
+def image_file_description_and_keyfindings(image_path: str, stats: dict = None, mode: str = "use",
+                                           content_hash: str = None) -> str:
+    image, image_hash, report, prior = prepare_image(image_path, stats, mode)
+    if prior is not None:
+        return prior
+
+    model = get_model()
+    start = time.perf_counter()
+    file_description, final_findings = describe_and_find(model, [DESCRIPTION_PROMPT, image])
+    report["llm_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    remember_image(image_hash, file_description, final_findings, mode, content_hash)
+    return file_description, final_findings
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+# ------------------- Configuration -------------------
+IMAGE_INDEX_DB_PATH = os.environ.get(
+    "IMAGE_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_index.sqlite3")
+)
+# Max differing bits (of 64) for two photos to count as the same scene
+IMAGE_HASH_DISTANCE = int(os.environ.get("IMAGE_HASH_DISTANCE", 6))
+IMAGE_INDEX_MAX_ENTRIES = int(os.environ.get("IMAGE_INDEX_MAX_ENTRIES", 20000))
+
+
+# ------------------- Perceptual hash -------------------
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: robust to rescaling, re-encoding and small exposure changes."""
+    gray = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ------------------- Index -------------------
+class ImageIndex:
+    """SQLite-backed map of perceptual hash -> prior (description, findings)."""
+
+    def __init__(self, db_path=IMAGE_INDEX_DB_PATH, max_distance=IMAGE_HASH_DISTANCE,
+                 max_entries=IMAGE_INDEX_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hashes = None  # version -> list of (hash, rowid), loaded on first lookup
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS images (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       hash TEXT NOT NULL,
+                       version TEXT NOT NULL,
+                       value TEXT NOT NULL,
+                       created REAL NOT NULL
+                   )"""
+            )
+            # SHA-256 of the upload each entry came from, so DELETE /cache/<sha256> reaches it
+            if "content_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(images)")}:
+                conn.execute("ALTER TABLE images ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images(content_hash)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _load(self):
+        if self._hashes is None:
+            self._hashes = {}
+            with self._connect() as conn:
+                for rowid, hash_hex, version in conn.execute("SELECT id, hash, version FROM images"):
+                    self._hashes.setdefault(version, []).append((int(hash_hex, 16), rowid))
+        return self._hashes
+
+    def lookup(self, image_hash: int, version: str):
+        """Closest prior result within max_distance as (value, distance), or None."""
+        with self._lock:
+            candidates = self._load().get(version, [])
+            best = min(
+                ((hamming(image_hash, h), rowid) for h, rowid in candidates),
+                default=None,
+            )
+        if best is None or best[0] > self.max_distance:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM images WHERE id = ?", (best[1],)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), best[0]
+
+    def add(self, image_hash: int, version: str, value, content_hash: str = None):
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO images (hash, version, value, created, content_hash) VALUES (?, ?, ?, ?, ?)",
+                (f"{image_hash:016x}", version, json.dumps(value), time.time(), content_hash),
+            )
+            self._load().setdefault(version, []).append((image_hash, cursor.lastrowid))
+            count = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            if count > self.max_entries:
+                # Drop the oldest entries and reload the in-memory hashes
+                conn.execute(
+                    "DELETE FROM images WHERE id IN (SELECT id FROM images ORDER BY id LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self._hashes = None
+
+    def invalidate_hash(self, content_hash: str):
+        """Drop the entries recorded for an upload's SHA-256."""
+        with self._lock, self._connect() as conn:
+            if conn.execute("DELETE FROM images WHERE content_hash = ?", (content_hash,)).rowcount:
+                self._hashes = None
+
+
+image_index = ImageIndex()
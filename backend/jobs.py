@@ -0,0 +1,173 @@
+import os
+import queue
+import threading
+import time
+import uuid
+
+# ------------------- Configuration -------------------
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_QUEUE = int(os.environ.get("JOB_MAX_QUEUE", 32))
+JOB_RETRY_AFTER = int(os.environ.get("JOB_RETRY_AFTER", 30))
+# Finished jobs are kept this long for polling, then dropped
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL", 3600))
+
+_current = threading.local()
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue is at JOB_MAX_QUEUE."""
+
+
+# ------------------- Progress -------------------
+def report_stage(stage: str):
+    """Record that the job running on this thread entered a stage (no-op outside jobs)."""
+    job = getattr(_current, "job", None)
+    if job is not None and job.stage != stage:
+        job.set_stage(stage)
+
+
+def report_event(event: str, **data):
+    """Emit a custom event (e.g. streamed text) on the job running on this thread (no-op outside jobs)."""
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job._emit(event, **data)
+
+
+# ------------------- Jobs -------------------
+class Job:
+    def __init__(self, job_id, filename):
+        self.id = job_id
+        self.filename = filename
+        self.status = "queued"
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.events = []
+        self._cond = threading.Condition()
+        self._emit("queued")
+
+    def _emit(self, event, **data):
+        with self._cond:
+            self.events.append({"event": event, "time": time.time(), **data})
+            self._cond.notify_all()
+
+    def set_stage(self, stage):
+        self.stage = stage
+        self._emit("stage", stage=stage)
+
+    def start(self):
+        with self._cond:
+            self.status = "running"
+            self._emit("running")
+
+    # The status and its event change together, so a reader that sees the job
+    # finished also sees its "done"/"error" event (see wait_events)
+    def complete(self, result):
+        with self._cond:
+            self.result = result
+            self.status = "done"
+            self.finished = time.time()
+            self._emit("done")
+
+    def fail(self, error):
+        with self._cond:
+            self.error = error
+            self.status = "error"
+            self.finished = time.time()
+            self._emit("error", error=error)
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "error")
+
+    def wait_events(self, after: int, timeout: float = 15):
+        """(events after index `after`, whether they run to the job's last event).
+
+        Blocks up to timeout for new events while the job is unfinished.
+        """
+        with self._cond:
+            if len(self.events) <= after and not self.is_finished:
+                self._cond.wait(timeout)
+            return self.events[after:], self.is_finished
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "created": self.created,
+            "finished": self.finished,
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """Bounded worker pool fed by a bounded queue."""
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_MAX_QUEUE, ttl=JOB_TTL_SECONDS):
+        self.workers = workers
+        self.ttl = ttl
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, filename, func, *args) -> Job:
+        """Queue func(*args) as a job; raises JobQueueFull when saturated."""
+        self._ensure_workers()
+        self._prune()
+        job = Job(uuid.uuid4().hex, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, func, args))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job, func, args = self._queue.get()
+            _current.job = job
+            job.start()
+            try:
+                job.complete(func(*args))
+            except Exception as e:
+                job.fail(str(e))
+            finally:
+                _current.job = None
+                self._queue.task_done()
+
+
+job_manager = JobManager()
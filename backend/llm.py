@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import dotenv
+from deadline import BudgetExceeded, call_timeout, remaining
+from telemetry import span, log_event
+
+dotenv.load_dotenv()
+
+# ------------------- Configuration -------------------
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+# Token bucket: sustained requests per second and burst size, per process
+LLM_RATE = float(os.environ.get("LLM_RATE", 5))
+LLM_BURST = int(os.environ.get("LLM_BURST", 10))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 30.0))
+# Concurrent model calls per process from async callers (see async_app.py)
+LLM_ASYNC_CONCURRENCY = int(os.environ.get("LLM_ASYNC_CONCURRENCY", 16))
+
+# google.api_core exception names worth retrying (matched by name so the stub needs no Google imports)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "Aborted", "TimeoutError", "ConnectionError",
+}
+
+
+class LLMRateLimited(Exception):
+    """Raised when no rate-limit token becomes available within the call timeout."""
+
+
+# ------------------- Backends -------------------
+def _gemini_backend(model_name):
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+    return genai.GenerativeModel(model_name)
+
+
+def _stub_backend(model_name):
+    from llm_stub import StubModel
+
+    return StubModel()
+
+
+BACKENDS = {
+    "gemini": _gemini_backend,
+    "stub": _stub_backend,
+}
+
+
+def register_backend(name, factory):
+    """Add a backend: factory(model_name) returns an object with generate_content()."""
+    BACKENDS[name] = factory
+
+
+# ------------------- Rate limiting -------------------
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available (returns 0), else the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def _wait_time(self, wait, deadline):
+        if deadline is None:
+            return wait
+        remaining = deadline - time.monotonic()
+        return min(wait, remaining) if remaining > 0 else None
+
+    def acquire(self, timeout=None) -> bool:
+        """Take one token, waiting up to timeout seconds (None = forever)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            wait = self._wait_time(wait, deadline)
+            if wait is None:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None) -> bool:
+        """acquire() for coroutines: sleeps without blocking the event loop."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            wait = self._wait_time(wait, deadline)
+            if wait is None:
+                return False
+            await asyncio.sleep(wait)
+
+
+# ------------------- Coalescing -------------------
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _content_fingerprint(part, digest):
+    if isinstance(part, str):
+        digest.update(part.encode("utf-8"))
+    elif hasattr(part, "tobytes"):  # PIL image
+        digest.update(repr((getattr(part, "mode", None), getattr(part, "size", None))).encode())
+        digest.update(part.tobytes())
+    elif isinstance(part, (bytes, bytearray)):
+        digest.update(part)
+    else:
+        digest.update(repr(part).encode("utf-8"))
+    digest.update(b"\x00")
+
+
+def request_key(model_name, contents, generation_config=None) -> str:
+    """Identity of a request: same model, contents and generation config."""
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for part in contents if isinstance(contents, (list, tuple)) else [contents]:
+        _content_fingerprint(part, digest)
+    digest.update(json.dumps(generation_config, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ------------------- Client -------------------
+class LLMClient:
+    """Process-wide model wrapper: rate limit, timeout, retries, in-flight coalescing.
+
+    Exposes generate_content() like the underlying model, so callers can use either.
+    """
+
+    def __init__(self, backend=LLM_BACKEND, model_name=MODEL_NAME, rate=LLM_RATE, burst=LLM_BURST,
+                 timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES):
+        self.backend = backend
+        self.model_name = model_name
+        self.model = BACKENDS[backend](model_name)
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._async_slots = None
+
+    def generate_content(self, contents, generation_config=None, timeout=None):
+        key = request_key(self.model_name, contents, generation_config)
+        while True:
+            with self._lock:
+                call = self._inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._inflight[key] = _InFlight()
+            if leader:
+                break
+
+            # An identical request is already upstream: share its answer, waiting no longer than our own budget
+            if not call.done.wait(remaining()):
+                raise BudgetExceeded("Request budget exhausted waiting for an identical LLM call")
+            if call.error is None:
+                return call.result
+            # The leader running out of its budget says nothing about ours: call again if time is left
+            if not isinstance(call.error, BudgetExceeded) or _budget_spent():
+                raise call.error
+
+        try:
+            call.result = self._call_with_retries(contents, generation_config, timeout or self.timeout)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def _call_with_retries(self, contents, generation_config, timeout):
+        attempt = 0
+        while True:
+            with span("llm_wait"):
+                if not self.bucket.acquire(call_timeout(timeout)):
+                    raise self._rate_limited()
+            try:
+                with span("llm", model=self.model_name, attempt=attempt):
+                    kwargs = self._request_kwargs(generation_config, call_timeout(timeout))
+                    return self.model.generate_content(contents, **kwargs)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    def generate_content_stream(self, contents, generation_config=None, timeout=None):
+        """Yield the response text in chunks as the model produces it.
+
+        Failures are only retried before the first chunk; identical requests are not coalesced.
+        """
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            with span("llm_wait"):
+                if not self.bucket.acquire(call_timeout(timeout)):
+                    raise self._rate_limited()
+            started = False
+            try:
+                with span("llm", model=self.model_name, attempt=attempt, stream=True):
+                    kwargs = self._request_kwargs(generation_config, call_timeout(timeout))
+                    for chunk in self.model.generate_content(contents, stream=True, **kwargs):
+                        started = True
+                        yield chunk.text
+                return
+            except Exception as e:
+                if started:
+                    if _budget_spent():
+                        raise BudgetExceeded("Request budget exhausted mid-stream") from e
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    async def generate_content_async(self, contents, generation_config=None, timeout=None):
+        """generate_content() for coroutines, via the backend's async API.
+
+        At most LLM_ASYNC_CONCURRENCY calls per process are upstream at once;
+        the rest wait on the semaphore. Identical requests are not coalesced.
+        """
+        timeout = timeout or self.timeout
+        if self._async_slots is None:
+            self._async_slots = asyncio.BoundedSemaphore(LLM_ASYNC_CONCURRENCY)
+        attempt = 0
+        while True:
+            async with self._async_slots:
+                with span("llm_wait"):
+                    if not await self.bucket.acquire_async(call_timeout(timeout)):
+                        raise self._rate_limited()
+                try:
+                    with span("llm", model=self.model_name, attempt=attempt):
+                        return await self.model.generate_content_async(
+                            contents, **self._request_kwargs(generation_config, call_timeout(timeout))
+                        )
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+            # Back off without holding a slot
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _request_kwargs(self, generation_config, timeout):
+        kwargs = {"request_options": {"timeout": timeout}}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        return kwargs
+
+    def _rate_limited(self):
+        """Error for a rate-limit wait that timed out: BudgetExceeded if the request's deadline is what ran out."""
+        if _budget_spent():
+            return BudgetExceeded("Request budget exhausted waiting for an LLM rate-limit token")
+        return LLMRateLimited("Timed out waiting for an LLM rate-limit token")
+
+    def _retry_delay(self, error, attempt) -> float:
+        """Backoff before retrying a failed call; re-raises errors that should not be retried.
+
+        Failures once the request's deadline has passed (or that could not be
+        retried before it) surface as BudgetExceeded.
+        """
+        if isinstance(error, BudgetExceeded):
+            raise error
+        if type(error).__name__ not in RETRYABLE_ERRORS or attempt >= self.max_retries:
+            if _budget_spent():
+                raise BudgetExceeded("Request budget exhausted") from error
+            raise error
+        # Exponential backoff with full jitter
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        left = remaining()
+        if left is not None and delay >= left:
+            raise BudgetExceeded("Request budget exhausted before the call could be retried") from error
+        log_event(logging.WARNING, "llm_retry", error=type(error).__name__, attempt=attempt, delay=round(delay, 2))
+        return delay
+
+
+def _budget_spent() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """The shared client, built on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
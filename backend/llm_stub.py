@@ -0,0 +1,93 @@
+"""Deterministic offline stand-in for the Gemini model.
+
+Select it with LLM_BACKEND=stub (see llm.py); STUB_LLM_LATENCY sets the simulated seconds per call.
+tests/test_ai.py checks each response mode's call count against it; run this file to
+compare the modes' latency offline:
+
+    python llm_stub.py [latency_seconds]
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+STUB_LLM_LATENCY = float(os.environ.get("STUB_LLM_LATENCY", 0.0))
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _timeout(kwargs):
+    return (kwargs.get("request_options") or {}).get("timeout")
+
+
+class StubModel:
+    """Mimics GenerativeModel.generate_content with canned, prompt-derived answers."""
+
+    def __init__(self, latency: float = None, structured_ok: bool = True):
+        self.latency = STUB_LLM_LATENCY if latency is None else latency
+        self.structured_ok = structured_ok
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        timeout = _timeout(kwargs)
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub call exceeded its {timeout:.1f}s timeout")
+        if self.latency:
+            time.sleep(self.latency)
+        answer = self._answer(contents, generation_config)
+        if stream:
+            return (StubResponse(piece) for piece in re.findall(r"\S+\s*", answer.text))
+        return answer
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs):
+        self.calls += 1
+        timeout = _timeout(kwargs)
+        if timeout is not None and self.latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"Stub call exceeded its {timeout:.1f}s timeout")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(contents, generation_config)
+
+    def _answer(self, contents, generation_config):
+        text = contents if isinstance(contents, str) else str(contents[0])
+        tag = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+        description = f"Stub Document {tag}\n\nA deterministic description of {len(text)} prompt characters."
+        findings = [
+            "Stub finding about the system's purpose.",
+            "Stub finding about a potential vulnerability.",
+        ]
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            if not self.structured_ok:
+                return StubResponse("not json")
+            return StubResponse(json.dumps({"description": description, "key_findings": findings}))
+        if "**Key Findings:**" in text:
+            return StubResponse("\n".join(f"- {finding}" for finding in findings))
+        return StubResponse(description)
+
+
+def main():
+    import sys
+    import ai
+
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    prompt = "Firewall rule export with 120 allow rules between DMZ and app tier."
+    for mode, structured_ok in (("two-call", True), ("structured", True), ("structured", False)):
+        ai.AI_RESPONSE_MODE = mode
+        model = StubModel(latency, structured_ok)
+        start = time.perf_counter()
+        description, findings = ai.describe_and_find(model, prompt)
+        elapsed = time.perf_counter() - start
+        label = mode if structured_ok else f"{mode} (bad JSON -> fallback)"
+        print(f"{label:<36}{model.calls} call(s){elapsed:>8.2f}s  findings={len(findings.splitlines())}")
+
+
+if __name__ == "__main__":
+    main()
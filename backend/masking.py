@@ -0,0 +1,127 @@
+import re
+
+# ------------------- PII Rules -------------------
+# Each rule is (label, pattern, flags), applied in the order listed, each to the
+# output of the one before, as the old per-module loops did. A single alternation
+# of all rules would scan once, but its leftmost match lets one rule cut into
+# another's (a card number swallowing a phone number, a word before an email
+# taking its local part), so results would differ from, and leak more than, the loops.
+EMAIL = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+PHONE = r"\b(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}\b"
+CREDIT_CARD = r"\b(?:\d[ -]*?){13,16}\b"
+TOKEN_SERIAL = r"\bHT-\d+-[A-Z]+\b"
+
+PROFILES = {
+    "excel": {
+        "rules": [
+            ("EMPLOYEE_ID", r"\bEMP\d+\b", "i"),
+            ("EMAIL", r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b", "i"),
+            ("TOKEN_SERIAL", TOKEN_SERIAL, "i"),
+            ("FULL_NAME", r"\b(?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b|\b[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b", "i"),
+            ("CREDIT_CARD", CREDIT_CARD, "i"),
+        ],
+    },
+    "pdf": {
+        "rules": [
+            ("EMAIL", EMAIL, ""),
+            ("PHONE", PHONE, ""),
+            ("IP", r"\b(?:\d{1,3}\.){3}\d{1,3}\b", ""),
+            ("CREDIT_CARD", CREDIT_CARD, ""),
+            ("NAME_TITLE", r"\b(?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+\b", ""),
+            ("TOKEN_SERIAL", TOKEN_SERIAL, ""),
+        ],
+    },
+    "ppt": {
+        "rules": [
+            ("EMAIL", EMAIL, ""),
+            ("PHONE", PHONE, ""),
+            # Two or more consecutive capitalized words (e.g., Sarah Thompson)
+            ("FULL_NAME", r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b", ""),
+        ],
+        # Matches containing these words are left as-is (slide titles, not people)
+        "exclude": {"FULL_NAME": r"Changes|Network|Security|Policy|Diagram|Review"},
+        # Masked line by line; whole lines matching this are table headers/context and are not masked
+        "keep_lines": r"\b(?:Revision|Full\s*Name|Email|Date|Changes)\b",
+    },
+}
+
+# Text larger than this is masked in newline-aligned chunks
+CHUNK_SIZE = 1024 * 1024
+
+
+# ------------------- Engine -------------------
+class MaskingEngine:
+    """Masks a profile's rules, each compiled once and applied in order."""
+
+    def __init__(self, rules, exclude=None, keep_lines=None):
+        exclude = exclude or {}
+        self.rules = []
+        for label, pattern, flags in rules:
+            compiled = re.compile(pattern, re.IGNORECASE if "i" in flags else 0)
+            placeholder = f"<{label}>"
+            if label in exclude:
+                self.rules.append((compiled, self._excluding(placeholder, re.compile(exclude[label], re.IGNORECASE))))
+            else:
+                self.rules.append((compiled, placeholder))
+        self.keep_lines = re.compile(keep_lines, re.IGNORECASE) if keep_lines else None
+
+    @staticmethod
+    def _excluding(placeholder, excluded):
+        """re.sub callback: the placeholder, unless the match contains an excluded word."""
+        def replace(match):
+            return match.group(0) if excluded.search(match.group(0)) else placeholder
+        return replace
+
+    def _sub(self, text):
+        for pattern, replacement in self.rules:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def _mask(self, text):
+        if self.keep_lines is None:
+            return self._sub(text)
+        # Same line split as str.splitlines(); each line keeps its own ending
+        parts = []
+        for line in text.splitlines(keepends=True):
+            body = line.rstrip("\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+            if not self.keep_lines.search(body):
+                line = self._sub(body) + line[len(body):]
+            parts.append(line)
+        return "".join(parts)
+
+    def mask(self, text: str, chunk_size: int = CHUNK_SIZE) -> str:
+        if not text:
+            return text
+        if len(text) <= chunk_size:
+            return self._mask(text)
+        parts = []
+        start = 0
+        while start < len(text):
+            end = text.find("\n", start + chunk_size)
+            end = len(text) if end == -1 else end + 1
+            parts.append(self._mask(text[start:end]))
+            start = end
+        return "".join(parts)
+
+
+_engines = {}
+
+
+def get_engine(profile: str) -> MaskingEngine:
+    """Compiled engine for a profile, built once per process."""
+    engine = _engines.get(profile)
+    if engine is None:
+        engine = _engines[profile] = MaskingEngine(**PROFILES[profile])
+    return engine
+
+
+def mask_text(text: str, profile: str) -> str:
+    """Replaces PII in text with <LABEL> placeholders using the given profile."""
+    return get_engine(profile).mask(text)
+
+
+def mask_series(series, profile: str):
+    """Masks a pandas Series of strings column-wise with Series.str.replace."""
+    for pattern, replacement in get_engine(profile).rules:
+        series = series.str.replace(pattern, replacement, regex=True)
+    return series
@@ -1,65 +1,247 @@
 import os
-import re
+import hashlib
+import logging
 from pypdf import PdfReader
-from pdf2image import convert_from_path
-import pytesseract
 from ai import file_description_and_keyfindings
+from masking import mask_text
+from ocr import ocr_pdf_pages, OCR_DPI
+from prompt_builder import build_content
+from deadline import out_of_extraction_time, mark_partial
+from telemetry import span, record_error, log_event
+from unit_store import UNIT_REUSE, unit_key, load_unit, save_unit
 
 # ------------------- PII Masking -------------------
-pii_patterns = {
-    "EMAIL": r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}",
-    "PHONE": r"\b(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}\b",
-    "IP": r"\b(?:\d{1,3}\.){3}\d{1,3}\b",
-    "CREDIT_CARD": r"\b(?:\d[ -]*?){13,16}\b",
-    "NAME_TITLE": r"\b(?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+\b",
-    "TOKEN_SERIAL": r'\bHT-\d+-[A-Z]+\b', 
-}
-
 def mask_pii(text: str) -> str:
     """Replaces PII patterns in text with placeholders."""
-    if not text:
-        return text
-    masked_text = text
-    for label, pattern in pii_patterns.items():
-        masked_text = re.sub(pattern, f"<{label}>", masked_text)
-    return masked_text
+    return mask_text(text, "pdf")
+
+# ------------------- Page Analysis -------------------
+# "auto": OCR only scanned/image-heavy pages, "always": OCR every page, "never": text layer only
+PDF_OCR_MODE = os.environ.get("PDF_OCR_MODE", "auto")
+# Pages with less extractable text than this are treated as scanned
+PDF_MIN_TEXT_CHARS = int(os.environ.get("PDF_MIN_TEXT_CHARS", 100))
+# Pages that contain images are OCR'd unless their text layer is at least this long
+PDF_IMAGE_PAGE_TEXT_CHARS = int(os.environ.get("PDF_IMAGE_PAGE_TEXT_CHARS", 500))
+
+def iter_page_xobjects(resources, depth: int = 0):
+    """Yield the image and form XObjects in a page's resources, looking inside form XObjects."""
+    if resources is None or depth > 3:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype in ("/Image", "/Form"):
+            yield xobject
+        if subtype == "/Form":
+            yield from iter_page_xobjects(xobject.get("/Resources"), depth + 1)
+
+def count_page_images(resources) -> int:
+    """Count image XObjects in a page's resources, looking inside form XObjects."""
+    return sum(1 for xobject in iter_page_xobjects(resources) if xobject.get("/Subtype") == "/Image")
+
+def iter_page_fonts(resources):
+    """Yield (name, font reference) for the fonts of a page's resources and of its form XObjects."""
+    if resources is None:
+        return
+    forms = [xobject.get("/Resources") for xobject in iter_page_xobjects(resources) if xobject.get("/Subtype") == "/Form"]
+    for form_resources in [resources, *forms]:
+        fonts = form_resources.get_object().get("/Font") if form_resources is not None else None
+        if fonts is not None:
+            yield from fonts.get_object().items()
+
+def hash_pdf_object(digest, obj, depth: int = 0):
+    """Feed a PDF object into digest: dictionaries and arrays recursively, streams with their data."""
+    obj = obj.get_object()
+    if depth > 8:
+        return
+    if isinstance(obj, dict):
+        for name in sorted(obj):
+            digest.update(f"{name}=".encode("utf-8"))
+            hash_pdf_object(digest, obj[name], depth + 1)
+        if hasattr(obj, "get_data"):
+            digest.update(obj.get_data())
+    elif isinstance(obj, list):
+        for item in obj:
+            hash_pdf_object(digest, item, depth + 1)
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+    digest.update(b";")
+
+def font_digest(font, memo: dict = None) -> bytes:
+    """Hash of everything in a font that text extraction reads (encoding, Differences, ToUnicode, widths, ...).
+
+    Fonts are usually shared by many pages: memo (per document) keeps each one's
+    hash by object number.
+    """
+    number = getattr(font, "idnum", None)
+    if memo is not None and number is not None and number in memo:
+        return memo[number]
+    digest = hashlib.sha256()
+    hash_pdf_object(digest, font)
+    if memo is not None and number is not None:
+        memo[number] = digest.digest()
+    return digest.digest()
+
+def page_key(page, mode: str = PDF_OCR_MODE, fonts: dict = None) -> str:
+    """Unit store key of a page: hash of its size, content stream, image/form data and fonts, plus OCR settings.
+
+    The fonts matter as much as the content stream: the same glyph codes decode
+    to different text under another encoding or ToUnicode map. fonts is the
+    per-document memo for font_digest.
+    """
+    digest = hashlib.sha256(repr([float(v) for v in page.mediabox]).encode("utf-8"))
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = page.get("/Resources")
+    for xobject in iter_page_xobjects(resources):
+        digest.update(xobject.get_data())
+    for name, font in iter_page_fonts(resources):
+        digest.update(name.encode("utf-8") + font_digest(font, fonts))
+    return unit_key(
+        digest.hexdigest(), "pdf_page", f"{mode}:{PDF_MIN_TEXT_CHARS}:{PDF_IMAGE_PAGE_TEXT_CHARS}:{OCR_DPI}"
+    )
+
+def classify_page(text: str, images: int, mode: str = PDF_OCR_MODE):
+    """Return (path, reason) for a page: path is "text" or "ocr"."""
+    chars = len(text.strip())
+    if mode == "always":
+        return "ocr", "forced"
+    if mode == "never":
+        return "text", "forced"
+    if chars < PDF_MIN_TEXT_CHARS:
+        return "ocr", "scanned" if images else "no-text"
+    if images and chars < PDF_IMAGE_PAGE_TEXT_CHARS:
+        return "ocr", "image-heavy"
+    return "text", "text-layer"
 
 # ------------------- PDF Extraction -------------------
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF using PyPDF (for selectable text) and OCR (for images)."""
-    full_text = ""
+def extract_pdf_pages(file_path: str, mode: str = PDF_OCR_MODE, mask: bool = False,
+                      cache_mode: str = "use", content_hash: str = None) -> list:
+    """Extract each page's text, OCR'ing only the pages that need it.
 
-    # 1. Extract selectable text with PyPDF
+    Returns one dict per page: page number, path ("text" or "ocr"), reason,
+    character and image counts, and the text used for that page. With mask the
+    text is masked, and pages go through the unit store: a page seen before (say,
+    in an earlier revision of the document) skips extraction and OCR and is
+    marked "reused" (cache_mode and content_hash as for unit_store.load_unit/save_unit).
+    Pages the request's deadline leaves no time for are left out.
+    """
+    pages = []
+    skipped = []
+    ocr_results = {}
+    fonts = {}
+
+    # 1. Inspect the text layer and images of every page with PyPDF
     try:
         reader = PdfReader(file_path)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                full_text += page_text + "\n"
+        for number, page in enumerate(reader.pages, start=1):
+            key = None
+            if mask and UNIT_REUSE and cache_mode != "bypass":
+                try:
+                    key = page_key(page, mode, fonts)
+                except Exception as e:
+                    record_error("pdf_page_key", e, page=number)
+                stored = load_unit(key, cache_mode, content_hash) if key else None
+                if stored is not None:
+                    pages.append({**stored, "page": number, "reused": True})
+                    continue
+            if skipped or out_of_extraction_time():
+                skipped.append(number)
+                continue
+            try:
+                page_text = page.extract_text() or ""
+            except Exception as e:
+                record_error("pdf_text", e, page=number)
+                page_text = ""
+                key = None  # not worth keeping a failed extraction
+            try:
+                images = count_page_images(page.get("/Resources"))
+            except Exception:
+                images = 0
+            path, reason = classify_page(page_text, images, mode)
+            pages.append({
+                "page": number,
+                "path": path,
+                "reason": reason,
+                "chars": len(page_text.strip()),
+                "images": images,
+                "text": page_text,
+                "key": key,
+            })
     except Exception as e:
-        print(f"Error extracting text with PyPDF: {e}")
+        record_error("pdf_text", e)
+    if skipped:
+        mark_partial("pdf_text", pages=skipped)
 
-    # 2. OCR for image-based text
+    # 2. OCR only the pages that need it (batched rendering, parallel OCR)
     try:
-        poppler_path = r"C:\Program Files (x86)\poppler-25.07.0\Library\bin"  
-        pages = convert_from_path(file_path, poppler_path=poppler_path, dpi=300)
+        if pages:
+            ocr_pages = [p["page"] for p in pages if p["path"] == "ocr" and not p.get("reused")]
+            ocr_results = ocr_pdf_pages(file_path, ocr_pages) if ocr_pages else {}
+        elif mode != "never":
+            # PyPDF could not read the file at all, fall back to OCR of every page
+            ocr_results = ocr_pdf_pages(file_path)
+            pages = [
+                {"page": number, "path": "ocr", "reason": "unreadable", "chars": 0, "images": 0, "text": ""}
+                for number in sorted(ocr_results)
+            ]
+        else:
+            ocr_results = {}
         for page in pages:
-            ocr_text = pytesseract.image_to_string(page)
+            ocr_text = ocr_results.get(page["page"], "")
             if ocr_text.strip():
-                full_text += "\n" + ocr_text
+                page["text"] = ocr_text
     except Exception as e:
-        print(f"Error extracting text via OCR: {e}")
+        record_error("ocr", e)
+        ocr_results = {}
+
+    if mask:
+        with span("mask"):
+            for page in pages:
+                key = page.pop("key", None)
+                if page.get("reused"):
+                    continue
+                page["text"] = mask_pii(page["text"])
+                page["reused"] = False
+                # OCR pages are kept only once OCR'd (not after a failure or the deadline)
+                if key and (page["path"] == "text" or page["page"] in ocr_results):
+                    save_unit(
+                        key, {name: page[name] for name in ("path", "reason", "chars", "images", "text")},
+                        cache_mode, content_hash,
+                    )
+    else:
+        for page in pages:
+            page.pop("key", None)
+    return pages
 
-    return full_text.strip()
+def page_report(pages: list) -> dict:
+    """Which pages took which path, for logging/responses."""
+    return {
+        "pages": len(pages),
+        "text_pages": [p["page"] for p in pages if p["path"] == "text"],
+        "ocr_pages": [p["page"] for p in pages if p["path"] == "ocr"],
+        "ocr_reasons": {p["page"]: p["reason"] for p in pages if p["path"] == "ocr"},
+        "reused_units": sum(1 for p in pages if p.get("reused")),
+    }
 
-# ------------------- Main -------------------
-def pdf_main(file_path: str):
-    text_content = extract_text_from_pdf(file_path)
-    if text_content:
-        # Mask PII
-        text_content_masked = mask_pii(text_content)
+def extract_text_from_pdf(file_path: str, stats: dict = None, cache_mode: str = "use", content_hash: str = None) -> str:
+    """Extracts masked text from a PDF using PyPDF (for selectable text) and OCR (for images)."""
+    with span("extract") as extract_span:
+        pages = extract_pdf_pages(file_path, mask=True, cache_mode=cache_mode, content_hash=content_hash)
+        extract_span["pages"] = len(pages)
+    if stats is not None:
+        stats.update(page_report(pages))
+    return "\n".join(p["text"].strip() for p in pages if p["text"].strip())
 
-        prompt = f"""
+# ------------------- Main -------------------
+def build_pdf_prompt(text_content: str, cache_mode: str = "use", content_hash: str = None) -> str:
+    """Budget the masked page text and wrap it in the PDF prompt."""
+    text_content_masked = build_content(text_content, "pdf", cache_mode=cache_mode, content_hash=content_hash)
+    return f"""
         Analyze the following extracted PDF text content. Generate a descriptive 
         title and a file caption of about 30 words that summarizes the document's 
         content, focusing on the security/IT-related context.
@@ -68,9 +250,12 @@ def pdf_main(file_path: str):
         ---
         {text_content_masked}
         """
+
+def pdf_main(file_path: str, stats: dict = None):
+    text_content = extract_text_from_pdf(file_path, stats)
+    if text_content:
+        prompt = build_pdf_prompt(text_content)
         file_description,key_findings = file_description_and_keyfindings(prompt)
         return file_description,key_findings
     else:
-        print("Failed to extract text from the PDF file.")
-
-
+        log_event(logging.WARNING, "no_text_extracted")
@@ -0,0 +1,257 @@
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import pytesseract
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pdf2image.exceptions import PDFPopplerTimeoutError
+from deadline import extraction_time_left, mark_partial
+from jobs import report_stage
+from spool import source_path
+from telemetry import span, record_error
+
+# ------------------- Configuration -------------------
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity and cpusets, e.g. container limits)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+OCR_DPI = int(os.environ.get("OCR_DPI", 300))
+# OCR processes per server process; 1 OCRs in the calling process, without a pool
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", available_cpus()))
+# Pages rendered per pdf2image call; at most 2 batches of page images exist at once
+OCR_BATCH_PAGES = int(os.environ.get("OCR_BATCH_PAGES", 4))
+POPPLER_PATH = os.environ.get("POPPLER_PATH") or (
+    r"C:\Program Files (x86)\poppler-25.07.0\Library\bin" if os.name == "nt" else None
+)
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD") or (
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe" if os.name == "nt" else None
+)
+if TESSERACT_CMD:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+# The pool is started lazily from a multithreaded server; forking there can copy
+# locks other threads hold, so workers come from a clean forkserver (spawn on Windows)
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ------------------- Worker -------------------
+def _init_worker(tesseract_cmd):
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def _image_to_string(image) -> str:
+    try:
+        return pytesseract.image_to_string(image)
+    except Exception as e:
+        # Some pytesseract errors can't be unpickled in the parent, which would
+        # break the whole pool; send back a plain error carrying the message
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _ocr_image_file(image_path: str) -> str:
+    """OCR one rendered page image and delete it (runs in a pool process)."""
+    try:
+        with Image.open(image_path) as image:
+            return _image_to_string(image)
+    finally:
+        os.remove(image_path)
+
+
+def _ocr_image_bytes(blob: bytes) -> str:
+    """OCR an in-memory image (runs in a pool process)."""
+    with Image.open(io.BytesIO(blob)) as image:
+        return _image_to_string(image)
+
+
+def get_pool(workers: int = OCR_WORKERS) -> ProcessPoolExecutor:
+    """Process-wide OCR pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_MP_CONTEXT,
+                initializer=_init_worker,
+                initargs=(TESSERACT_CMD,),
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop a pool broken by a dead worker so the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(workers, fn, arg):
+    """Submit to the OCR pool, replacing it once if it is already broken; returns (pool, future).
+
+    With a single worker there is no pool: fn runs here, in the caller's process
+    (batch.py's extraction processes, which must not start pools of their own).
+    """
+    if workers <= 1:
+        future = Future()
+        try:
+            future.set_result(fn(arg))
+        except Exception as e:
+            future.set_exception(e)
+        return None, future
+    pool = get_pool(workers)
+    try:
+        return pool, pool.submit(fn, arg)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        pool = get_pool(workers)
+        return pool, pool.submit(fn, arg)
+
+
+# ------------------- PDF OCR -------------------
+def _batches(page_numbers, batch_size):
+    """Split sorted page numbers into runs of consecutive pages, at most batch_size long."""
+    batch = []
+    for number in page_numbers:
+        if batch and (number != batch[-1] + 1 or len(batch) == batch_size):
+            yield batch
+            batch = []
+        batch.append(number)
+    if batch:
+        yield batch
+
+
+def count_pdf_pages(file_path: str) -> int:
+    return int(pdfinfo_from_path(file_path, poppler_path=POPPLER_PATH)["Pages"])
+
+
+def _collect(pending, results, skipped, keep=0):
+    """Move finished page results from pending into results until keep are left.
+
+    Pages whose OCR failed are left out (and counted as errors). Under a request
+    deadline, pages not done by the time extraction has to stop are cancelled
+    and added to skipped.
+    """
+    while len(pending) > keep:
+        number, pool, future = pending.popleft()
+        try:
+            results[number] = future.result(timeout=extraction_time_left())
+        except FuturesTimeout:
+            future.cancel()
+            skipped.append(number)
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            record_error("ocr", e, page=number)
+        except Exception as e:
+            record_error("ocr", e, page=number)
+
+
+def ocr_pdf_pages(file_path, pages=None, workers: int = None,
+                  batch_size: int = OCR_BATCH_PAGES, dpi: int = OCR_DPI) -> dict:
+    """OCR PDF pages in rendered batches across the process pool.
+
+    file_path is a path or an in-memory binary stream (poppler needs a file, so a
+    stream is written out once). pages is an iterable of 1-based page numbers
+    (default: every page). Returns {page_number: text}, one entry per requested page
+    except pages that failed or that the request's deadline cut short (see deadline.py).
+    """
+    if pages is not None:
+        pages = sorted(set(pages))
+        if not pages:
+            return {}
+
+    report_stage("ocr")
+    workers = workers or OCR_WORKERS
+    results = {}
+    pending = deque()
+    skipped = []
+    tmp_dir = tempfile.mkdtemp(prefix="ocr_")
+    try:
+        with span("ocr") as ocr_span:
+            file_path = source_path(file_path, tmp_dir, ".pdf")
+            if pages is None:
+                pages = list(range(1, count_pdf_pages(file_path) + 1))
+            ocr_span["pages"] = len(pages)
+            for batch in _batches(pages, batch_size):
+                left = extraction_time_left()
+                if skipped or (left is not None and left <= 0):
+                    skipped.extend(batch)
+                    continue
+                try:
+                    image_paths = convert_from_path(
+                        file_path,
+                        dpi=dpi,
+                        first_page=batch[0],
+                        last_page=batch[-1],
+                        poppler_path=POPPLER_PATH,
+                        output_folder=tmp_dir,
+                        fmt="ppm",  # uncompressed, cheapest to write and read back
+                        paths_only=True,
+                        timeout=left,
+                    )
+                except PDFPopplerTimeoutError:
+                    skipped.extend(batch)
+                    continue
+                except Exception as e:
+                    # Keep the pages already OCR'd; a batch poppler can't render is left out
+                    record_error("ocr", e, pages=batch)
+                    continue
+                for number, image_path in zip(batch, sorted(image_paths)):
+                    pending.append((number, *_submit(workers, _ocr_image_file, image_path)))
+                # Wait for the previous batch before rendering the next one
+                _collect(pending, results, skipped, keep=batch_size)
+            _collect(pending, results, skipped)
+            if skipped:
+                ocr_span["skipped"] = len(skipped)
+                mark_partial("ocr", pages=sorted(skipped))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+# ------------------- Image OCR -------------------
+def ocr_image_blobs(blobs: dict, workers: int = None) -> dict:
+    """OCR {key: image bytes} in parallel; returns {key: text}.
+
+    Images that fail to decode or OCR are left out (and counted as errors), as
+    are images still queued or running when the request's deadline stops OCR.
+    """
+    if not blobs:
+        return {}
+    report_stage("ocr")
+    workers = workers or OCR_WORKERS
+    results = {}
+    skipped = 0
+    with span("ocr", images=len(blobs)) as ocr_span:
+        futures = {key: _submit(workers, _ocr_image_bytes, blob) for key, blob in blobs.items()}
+        for key, (pool, future) in futures.items():
+            try:
+                results[key] = future.result(timeout=extraction_time_left())
+            except FuturesTimeout:
+                future.cancel()
+                skipped += 1
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                record_error("ocr", e, image=str(key))
+            except Exception as e:
+                record_error("ocr", e, image=str(key))
+        if skipped:
+            ocr_span["skipped"] = skipped
+            mark_partial("ocr", images=skipped)
+    return results
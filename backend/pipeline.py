@@ -0,0 +1,258 @@
+import logging
+import os
+import time
+
+# Extractors (and pandas, OCR, python-pptx...) are imported on first use, see extractors.py
+from extractors import get_extractor, sniff_file_type, type_for_extension
+from ai import (
+    MODEL_NAME, PROMPT_VERSION, AI_RESPONSE_MODE,
+    get_model, describe_and_find_streaming, file_description_and_keyfindings, file_description_and_keyfindings_streaming,
+    refresh_description,
+)
+from cache import result_cache, make_key
+from deadline import BudgetExceeded, deadline_scope, is_partial, REQUEST_BUDGET_SECONDS
+from jobs import report_stage, report_event
+from telemetry import span, request_context, log_event, record_error, REQUESTS, CACHE_LOOKUPS, BYTES_PROCESSED
+
+ALLOWED_EXTENSIONS = {"pdf", "ppt", "pptx", "xls", "xlsx", "jpg", "png"}
+
+# Results are only reused for the same model, prompt set and response mode
+CACHE_VERSION = f"{MODEL_NAME}:{PROMPT_VERSION}:{AI_RESPONSE_MODE}"
+CACHE_MODES = {"use", "refresh", "bypass"}
+
+# Near-duplicate documents (text_index.py): "reuse" returns the prior result as is,
+# "refresh" updates its description from the added lines in one model call, "off" never matches
+TEXT_REUSE = os.environ.get("TEXT_REUSE", "reuse")
+
+
+# ------------------- Request parsing -------------------
+def allowed_file(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def cache_mode(args, headers):
+    """Per-request cache mode: ?cache=use|refresh|bypass (Cache-Control: no-cache means refresh)."""
+    mode = args.get("cache", "use").lower()
+    if mode not in CACHE_MODES:
+        mode = "use"
+    if mode == "use" and "no-cache" in headers.get("Cache-Control", "").lower():
+        mode = "refresh"
+    return mode
+
+
+def get_file_type(upload, ext):
+    """File type from the upload's magic bytes; the extension only disambiguates legacy Office files."""
+    file_type = sniff_file_type(upload.source(), ext)
+    if file_type is not None and file_type != type_for_extension(ext):
+        log_event(logging.INFO, "extension_mismatch", filename=upload.filename, file_type=file_type)
+    return file_type
+
+
+# ------------------- Analysis -------------------
+def require_text(text, file_type):
+    if not text:
+        if is_partial():
+            raise BudgetExceeded(f"Request budget exhausted before any text was extracted from the {file_type} file")
+        raise ValueError(f"No text could be extracted from the {file_type} file")
+
+
+def match_text(text, file_type, stats, mode="use"):
+    """(signature, NearDuplicate or None) for a document's masked text.
+
+    Follows the request's cache mode: "refresh" skips the lookup, "bypass" also
+    leaves the signature None so the result is not indexed.
+    """
+    if TEXT_REUSE not in ("reuse", "refresh") or mode == "bypass":
+        return None, None
+    from text_index import text_index, minhash  # numpy, only once there is text to compare
+    with span("near_duplicate"):
+        signature = minhash(text)
+        if signature is None or mode != "use":
+            return signature, None
+        match = text_index.lookup(signature, file_type, CACHE_VERSION, text if TEXT_REUSE == "refresh" else None)
+    CACHE_LOOKUPS.inc(cache="text", result="miss" if match is None else "hit")
+    if match is not None:
+        stats["near_duplicate"] = {
+            "similarity": round(match.similarity, 3),
+            "refreshed": bool(match.added_text),
+        }
+    return signature, match
+
+
+def remember_text(signature, text, file_type, file_description, key_findings, content_hash=None):
+    if signature is not None and file_description and key_findings and not is_partial():
+        from text_index import text_index
+        text_index.add(signature, text, file_type, CACHE_VERSION, [file_description, key_findings], content_hash)
+
+
+def reuse_text_result(signature, text, file_type, match, content_hash=None):
+    """A near-duplicate's prior result, with its description refreshed if lines were added."""
+    file_description, key_findings = match.value
+    if match.added_text:
+        file_description = refresh_description(file_description, match.added_text)
+        remember_text(signature, text, file_type, file_description, key_findings, content_hash)
+    return file_description, key_findings
+
+
+def process_file(source, file_type, stats=None, mode="use", content_hash=None):
+    """Extract a path or binary stream and analyze it, reusing near-duplicates' results; fills stats.
+
+    mode ("use", "refresh" or "bypass") also applies to the pages, slides and
+    summaries in the unit store. content_hash (the upload's SHA-256) is recorded
+    with what the near-duplicate indexes and the unit store learn, so
+    invalidate_results() can drop it again.
+    """
+    stats = {} if stats is None else stats
+    extractor = get_extractor(file_type)
+    if extractor.text_function is None:
+        # Images: the only extractor without a text stage (see image.py)
+        return extractor.run(source, stats, mode=mode, content_hash=content_hash)
+    text = extractor.extract_text(source, stats, mode, content_hash)
+    require_text(text, file_type)
+    signature, match = match_text(text, file_type, stats, mode)
+    if match is not None:
+        return reuse_text_result(signature, text, file_type, match, content_hash)
+    result = file_description_and_keyfindings(extractor.build_prompt(text, mode, content_hash))
+    remember_text(signature, text, file_type, *result, content_hash)
+    return result
+
+
+def lookup_result(upload, file_type, mode):
+    """(cache key, cached [description, findings] or None) for an upload."""
+    REQUESTS.inc(file_type=file_type)
+    cache_key = make_key(upload.sha256, file_type, CACHE_VERSION)
+    cached = None
+    if mode == "use":
+        cached = result_cache.get(cache_key)
+        CACHE_LOOKUPS.inc(cache="result", result="miss" if cached is None else "hit")
+    return cache_key, cached
+
+
+def invalidate_results(content_hash):
+    """Forget an upload (by SHA-256) wherever its analysis is reused."""
+    result_cache.invalidate_hash(content_hash)
+    from image_index import image_index  # Pillow and numpy, not needed at startup
+    from text_index import text_index
+    from unit_store import unit_store
+    image_index.invalidate_hash(content_hash)
+    text_index.invalidate_hash(content_hash)
+    unit_store.invalidate_hash(content_hash)
+
+
+def store_result(cache_key, mode, file_description, key_findings):
+    # Partial results (cut short by the deadline) are never reused
+    if mode != "bypass" and not is_partial():
+        result_cache.set(cache_key, [file_description, key_findings])
+
+
+def build_response(upload, file_type, file_description, key_findings, cached, stats, start, deadline=None):
+    """The JSON response body; logs one "analyzed" record per file.
+
+    If the deadline cut any stage short, "partial" is true and "partial_stages" says which.
+    """
+    partial = deadline is not None and deadline.partial
+    log_event(
+        logging.INFO, "analyzed", filename=upload.filename, cached=cached, partial=partial,
+        seconds=round(time.perf_counter() - start, 3),
+        description_chars=len(file_description or ""), findings_chars=len(key_findings or ""),
+    )
+    response = {
+        "filename": upload.filename,
+        "file_type": file_type,
+        "file_description": file_description,
+        "key_findings": key_findings,
+        "cached": cached,
+    }
+    if stats:
+        response["extraction"] = stats
+    if partial:
+        response["partial"] = True
+        response["partial_stages"] = deadline.skipped
+    return response
+
+
+def analyze_file(upload, file_type, mode, budget=REQUEST_BUDGET_SECONDS):
+    """Cache lookup, then extraction + LLM analysis within budget seconds; returns the JSON response body."""
+    start = time.perf_counter()
+    with request_context(file_type, upload.size), deadline_scope(budget) as deadline:
+        cache_key, cached = lookup_result(upload, file_type, mode)
+        stats = {}
+        if cached is not None:
+            file_description, key_findings = cached
+        else:
+            report_stage("extracting")
+            BYTES_PROCESSED.inc(upload.size, file_type=file_type)
+            with span("analyze"):
+                file_description, key_findings = process_file(upload.source(), file_type, stats, mode, upload.sha256)
+            store_result(cache_key, mode, file_description, key_findings)
+        return build_response(
+            upload, file_type, file_description, key_findings, cached is not None, stats, start, deadline
+        )
+
+
+def process_file_streaming(source, file_type, stats, mode="use", content_hash=None):
+    """process_file() that reports extraction details and streams the description as job events."""
+    extractor = get_extractor(file_type)
+    module = extractor.load()
+    if extractor.text_function is None:
+        image, image_hash, report, prior = module.prepare_image(source, stats, mode)
+        report_event("extracted", extraction=stats)
+        if prior is not None:
+            report_event("description", delta=prior[0])
+            return prior
+        result = describe_and_find_streaming(get_model(), [module.DESCRIPTION_PROMPT, image])
+        module.remember_image(image_hash, *result, mode, content_hash)
+        return result
+    text = extractor.extract_text(source, stats, mode, content_hash)
+    require_text(text, file_type)
+    signature, match = match_text(text, file_type, stats, mode)
+    report_event("extracted", chars=len(text), extraction=stats)
+    if match is not None:
+        result = reuse_text_result(signature, text, file_type, match, content_hash)
+        report_event("description", delta=result[0])
+        return result
+    result = file_description_and_keyfindings_streaming(extractor.build_prompt(text, mode, content_hash))
+    remember_text(signature, text, file_type, *result, content_hash)
+    return result
+
+
+def analyze_file_streaming(upload, file_type, mode, budget=REQUEST_BUDGET_SECONDS):
+    """analyze_file() for /upload/stream: same result, with progress and the description sent as events."""
+    start = time.perf_counter()
+    with request_context(file_type, upload.size), deadline_scope(budget) as deadline:
+        cache_key, cached = lookup_result(upload, file_type, mode)
+        stats = {}
+        if cached is not None:
+            file_description, key_findings = cached
+            report_event("description", delta=file_description)
+        else:
+            report_stage("extracting")
+            BYTES_PROCESSED.inc(upload.size, file_type=file_type)
+            with span("analyze"):
+                file_description, key_findings = process_file_streaming(
+                    upload.source(), file_type, stats, mode, upload.sha256
+                )
+            store_result(cache_key, mode, file_description, key_findings)
+        report_event("findings", key_findings=key_findings)
+        return build_response(
+            upload, file_type, file_description, key_findings, cached is not None, stats, start, deadline
+        )
+
+
+def _run_job(analyze, upload, file_type, mode, budget):
+    with upload:
+        try:
+            return analyze(upload, file_type, mode, budget)
+        except Exception as e:
+            # The job keeps the message; count the failure as a synchronous request's would be
+            record_error("request", e, file_type=file_type, filename=upload.filename)
+            raise
+
+
+def run_streaming_job(upload, file_type, mode, budget=REQUEST_BUDGET_SECONDS):
+    return _run_job(analyze_file_streaming, upload, file_type, mode, budget)
+
+
+def run_job(upload, file_type, mode, budget=REQUEST_BUDGET_SECONDS):
+    """Job body: analyze a spooled upload, then release it; the budget starts when the job does."""
+    return _run_job(analyze_file, upload, file_type, mode, budget)
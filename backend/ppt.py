@@ -1,105 +1,175 @@
 import os
-import re
+import logging
+import shutil
+import tempfile
 import pytesseract
 from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
 from PIL import Image
-import comtypes.client
 from ai import file_description_and_keyfindings
-
-# ------------------- Configure Tesseract -------------------
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+from masking import mask_text
+from prompt_builder import build_content
+from ocr import ocr_image_blobs  # also applies the Tesseract path
+from spool import source_path
+from telemetry import span, record_error, log_event
+from unit_store import hash_bytes, unit_key, load_unit, save_unit
+
+# "images": OCR picture blobs straight from the pptx (headless, default)
+# "com": export whole slides through PowerPoint (Windows only, legacy)
+# "none": text frames and tables only
+PPT_OCR_MODE = os.environ.get("PPT_OCR_MODE", "images")
+# Formats Pillow/Tesseract can read; vector EMF/WMF images are skipped
+OCR_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "bmp", "tif", "tiff"}
 
 # ------------------- PII Masking -------------------
-pii_patterns = {
-    "EMPLOYEE_ID": r'\bEMP\d+\b',                        
-    "EMAIL": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-    "TOKEN_SERIAL": r'\bHT-\d+-[A-Z]+\b',                
-    "FULL_NAME": r'\b(?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b|\b[A-Z][a-z]+(?:\s[A-Z][a-z]+)+\b',
-    "CREDIT_CARD": r"\b(?:\d[ -]*?){13,16}\b",
-}
-
-
 def mask_pii(text: str) -> str:
     """Mask PII while preserving table headers and context text."""
-    if not text:
-        return text
+    return mask_text(text, "ppt")
 
-    masked_lines = []
-    lines = text.splitlines()
 
-    for line in lines:
-        if re.search(r"\b(Revision|Full\s*Name|Email|Date|Changes)\b", line, re.IGNORECASE):
-            masked_lines.append(line)
+# ------------------- Image OCR -------------------
+def iter_picture_images(shapes):
+    """Yield the python-pptx Image of every picture shape, recursing into groups."""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from iter_picture_images(shape.shapes)
             continue
+        try:
+            image = shape.image  # pictures and picture placeholders
+        except (AttributeError, ValueError):
+            continue
+        if image.ext.lower() in OCR_IMAGE_EXTENSIONS:
+            yield image
+
+def ocr_ppt_images(prs, stats: dict = None, cache_mode: str = "use", content_hash: str = None) -> list:
+    """Masked OCR text of each distinct embedded image, in order of first appearance.
+
+    Images already in the unit store (from this deck's earlier revisions, or any
+    other deck) are not OCR'd again.
+    """
+    blobs = {}
+    for slide in prs.slides:
+        for image in iter_picture_images(slide.shapes):
+            # sha1 of the image bytes: repeated logos are OCR'd once
+            if image.sha1 not in blobs:
+                blobs[image.sha1] = image.blob
+    texts = {}
+    for key in blobs:
+        stored = load_unit(unit_key(key, "image_ocr"), cache_mode, content_hash)
+        if stored is not None:
+            texts[key] = stored["text"]
+    results = ocr_image_blobs({key: blob for key, blob in blobs.items() if key not in texts})
+    if stats is not None:
+        stats["images"] = len(blobs)
+        stats["reused_images"] = len(texts)
+    with span("mask"):
+        for key, text in results.items():
+            texts[key] = mask_pii(text) if text.strip() else ""
+            save_unit(unit_key(key, "image_ocr"), {"text": texts[key]}, cache_mode, content_hash)
+    return [texts.get(key, "") for key in blobs]
+
+def ocr_ppt_slides_com(ppt_file: str) -> list:
+    """Export slides as PNGs through PowerPoint and OCR them (Windows only)."""
+    import comtypes.client
+
+    out_dir = tempfile.mkdtemp(prefix="slides_")
+    try:
+        powerpoint = comtypes.client.CreateObject("PowerPoint.Application")
+        powerpoint.Visible = 0  # set 1 if you want PowerPoint window to appear
+        ppt_path = source_path(ppt_file, out_dir, ".pptx")
+        presentation = powerpoint.Presentations.Open(os.path.abspath(ppt_path))
 
+        # Export slides as PNG images
+        presentation.SaveAs(out_dir, 17)  # 17 = PNG
+        presentation.Close()
+        powerpoint.Quit()
 
-        masked_line = line
-        masked_line = re.sub(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", "<EMAIL>", masked_line)
-        masked_line = re.sub(r"\b(?:\+?\d{1,3}[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)?\d{3}[-.\s]?\d{4}\b", "<PHONE>", masked_line)
-
-        # Full names: Two consecutive capitalized words (e.g., Sarah Thompson)
-        masked_line = re.sub(
-            r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)+)\b",
-            lambda m: "<FULL_NAME>" if not re.search(r"(Changes|Network|Security|Policy|Diagram|Review)", m.group(1), re.IGNORECASE) else m.group(1),
-            masked_line
-        )
-
-        masked_lines.append(masked_line)
-
-    return "\n".join(masked_lines)
-
+        # OCR on exported slide images
+        texts = []
+        for img_file in sorted(os.listdir(out_dir)):
+            if img_file.lower().endswith(".png"):
+                img_path = os.path.join(out_dir, img_file)
+                texts.append(pytesseract.image_to_string(Image.open(img_path)))
+        return texts
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
 
 # ------------------- PPT Extraction -------------------
-def extract_text_from_ppt(ppt_file: str) -> str:
+def iter_slide_text(slide):
+    """Unmasked text of a slide: a string per text shape, a tuple of cell texts per table row."""
+    for shape in slide.shapes:
+        if hasattr(shape, "text"):  # normal textbox
+            yield shape.text
+        elif shape.has_table:  # table
+            for row in shape.table.rows:
+                yield tuple(cell.text.strip() for cell in row.cells)
+
+def mask_slide_text(item) -> str:
+    """Mask one iter_slide_text item; table cells are masked separately."""
+    if isinstance(item, tuple):
+        return "\t".join(mask_pii(cell) for cell in item)
+    return mask_pii(item)
+
+def masked_slide_text(slide, cache_mode: str = "use", content_hash: str = None):
+    """(masked text of a slide, whether it came from the unit store): reused while the slide's XML is unchanged."""
+    key = unit_key(hash_bytes(slide.part.blob), "slide")
+    stored = load_unit(key, cache_mode, content_hash)
+    if stored is not None:
+        return stored["text"], True
+    text = "".join(mask_slide_text(item) + "\n" for item in iter_slide_text(slide))
+    save_unit(key, {"text": text}, cache_mode, content_hash)
+    return text, False
+
+def extract_text_from_ppt(ppt_file: str, stats: dict = None, cache_mode: str = "use", content_hash: str = None) -> str:
     """Extract text from PPT/PPTX using python-pptx and OCR fallback."""
+    with span("extract"):
+        return _extract_text_from_ppt(ppt_file, stats, cache_mode, content_hash)
+
+def _extract_text_from_ppt(ppt_file: str, stats: dict = None, cache_mode: str = "use", content_hash: str = None) -> str:
     text_content = ""
+    prs = None
 
     # -------- Direct text extraction (text boxes + tables) --------
     try:
         prs = Presentation(ppt_file)
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):  # normal textbox
-                    text_content += mask_pii(shape.text) + "\n"
-                elif shape.has_table:  # table
-                    for row in shape.table.rows:
-                        row_text = "\t".join(mask_pii(cell.text.strip()) for cell in row.cells)
-                        text_content += row_text + "\n"
+        slides = list(prs.slides)
+        reused = 0
+        with span("mask"):
+            for slide in slides:
+                text, from_store = masked_slide_text(slide, cache_mode, content_hash)
+                text_content += text
+                reused += from_store
+        if stats is not None:
+            stats["slides"] = len(slides)
+            stats["reused_units"] = reused
 
     except Exception as e:
-        print(f"Error extracting text directly: {e}")
+        record_error("ppt_text", e)
 
     # -------- OCR fallback (for diagrams/images) --------
     try:
-        out_dir = os.path.abspath("slides")
-        os.makedirs(out_dir, exist_ok=True)
-
-        powerpoint = comtypes.client.CreateObject("PowerPoint.Application")
-        powerpoint.Visible = 0  # set 1 if you want PowerPoint window to appear
-        presentation = powerpoint.Presentations.Open(os.path.abspath(ppt_file))
-
-        # Export slides as PNG images
-        presentation.SaveAs(out_dir, 17)  # 17 = PNG
-        presentation.Close()
-        powerpoint.Quit()
-
-        # OCR on exported slide images
-        for img_file in sorted(os.listdir(out_dir)):
-            if img_file.lower().endswith(".png"):
-                img_path = os.path.join(out_dir, img_file)
-                ocr_text = pytesseract.image_to_string(Image.open(img_path))
-                if ocr_text.strip():
-                    text_content += mask_pii(ocr_text) + "\n"
+        if PPT_OCR_MODE == "com":
+            with span("ocr"):
+                ocr_texts = ocr_ppt_slides_com(ppt_file)
+            with span("mask"):
+                ocr_texts = [mask_pii(ocr_text) for ocr_text in ocr_texts if ocr_text.strip()]
+        elif PPT_OCR_MODE == "images" and prs is not None:
+            ocr_texts = ocr_ppt_images(prs, stats, cache_mode, content_hash)
+        else:
+            ocr_texts = []
+        for ocr_text in ocr_texts:
+            if ocr_text.strip():
+                text_content += ocr_text + "\n"
 
     except Exception as e:
-        print(f"Error extracting OCR text: {e}")
+        record_error("ocr", e)
 
     return text_content.strip()
 
-def ppt_main(file_path: str):
-    text_content = extract_text_from_ppt(file_path)
-    if text_content:
-        prompt = f"""
+def build_ppt_prompt(text_content: str, cache_mode: str = "use", content_hash: str = None) -> str:
+    """Budget the masked slide text and wrap it in the presentation prompt."""
+    text_content = build_content(text_content, "ppt", cache_mode=cache_mode, content_hash=content_hash)
+    return f"""
         Analyze the following cleansed presentation data (PPT/PPTX file). Generate a descriptive 
         title and a file caption of about 30 words that summarizes the data's content, 
         focusing on the security/IT-related context (e.g., Firewall rules, User Access Log, 
@@ -108,11 +178,12 @@ def ppt_main(file_path: str):
         ---
         {text_content}
         """
+
+def ppt_main(file_path: str, stats: dict = None):
+    text_content = extract_text_from_ppt(file_path, stats)
+    if text_content:
+        prompt = build_ppt_prompt(text_content)
         file_description,key_findings = file_description_and_keyfindings(prompt)
         return file_description,key_findings
     else:
-        print("Failed to extract text from the PDF file.")
-
-
-
-
+        log_event(logging.WARNING, "no_text_extracted")
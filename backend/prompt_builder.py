@@ -0,0 +1,201 @@
+import contextvars
+import hashlib
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from deadline import BudgetExceeded, extraction_time_left, mark_partial
+from jobs import report_stage
+from llm import get_client
+from telemetry import span
+from unit_store import hash_bytes, unit_key, load_unit, save_unit
+
+# ------------------- Budgets -------------------
+# Approximate token budget for the extracted content pasted into each format's prompt
+PROMPT_BUDGETS = {
+    "excel": int(os.environ.get("PROMPT_BUDGET_EXCEL", 12000)),
+    "ppt": int(os.environ.get("PROMPT_BUDGET_PPT", 12000)),
+    "pdf": int(os.environ.get("PROMPT_BUDGET_PDF", 16000)),
+}
+# Size of each piece summarized in the map step, and how many run at once
+PROMPT_CHUNK_TOKENS = int(os.environ.get("PROMPT_CHUNK_TOKENS", 6000))
+PROMPT_MAP_WORKERS = int(os.environ.get("PROMPT_MAP_WORKERS", 4))
+# Reduce rounds before the content is truncated to the budget
+PROMPT_MAX_ROUNDS = 3
+# Past 3/4 of a chunk, about one line in this many ends it (see chunk_text)
+CHUNK_BOUNDARY_LINES = 8
+# Stand-in for a summary the deadline did not leave time for: the chunk's start
+SUMMARY_FALLBACK_CHARS = 1200
+
+# Rough chars-per-token ratio for English/tabular text
+CHARS_PER_TOKEN = 4
+
+KIND_NAMES = {"excel": "spreadsheet", "ppt": "presentation", "pdf": "PDF document"}
+
+_whitespace = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# ------------------- De-duplication -------------------
+def _fingerprint(text):
+    return hashlib.sha1(_whitespace.sub(" ", text).strip().lower().encode("utf-8")).digest()
+
+
+def dedupe_text(text: str) -> str:
+    """Drop repeated blocks (blank-line separated), then repeated non-blank lines.
+
+    Keeps the first occurrence of each; catches things like a PDF page whose
+    OCR repeats its text layer, or boilerplate footers on every slide.
+    """
+    seen_blocks = set()
+    seen_lines = set()
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        if not block.strip():
+            continue
+        key = _fingerprint(block)
+        if key in seen_blocks:
+            continue
+        seen_blocks.add(key)
+        lines = []
+        for line in block.splitlines():
+            if line.strip():
+                key = _fingerprint(line)
+                if key in seen_lines:
+                    continue
+                seen_lines.add(key)
+            lines.append(line)
+        if any(line.strip() for line in lines):
+            blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+# ------------------- Chunking -------------------
+def _is_boundary(line: str) -> bool:
+    return zlib.crc32(line.encode("utf-8")) % CHUNK_BOUNDARY_LINES == 0
+
+
+def chunk_text(text: str, chunk_tokens: int = PROMPT_CHUNK_TOKENS) -> list:
+    """Split on line boundaries into pieces of at most chunk_tokens each.
+
+    Once a piece is 3/4 full it ends after the first line whose hash marks it as a
+    boundary, so boundaries follow the content rather than offsets: editing one
+    page of a long document changes the pieces around the edit, not every piece
+    after it, and the other pieces' summaries are reused (see summarize_chunks).
+    """
+    limit = chunk_tokens * CHARS_PER_TOKEN
+    minimum = limit * 3 // 4
+    chunks, current, size = [], [], 0
+    for line in text.splitlines():
+        # Hard-wrap single lines that are longer than a whole chunk
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if size + len(line) + 1 > limit and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+        if size >= minimum and _is_boundary(line):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+# ------------------- Map-reduce -------------------
+# Bump whenever _summary_prompt changes so stored chunk summaries are not reused
+SUMMARY_VERSION = "1"
+
+
+def _summary_prompt(chunk, kind, index, total):
+    return f"""
+    The following is part {index} of {total} of the cleansed content of a {kind}.
+    Summarize it in at most 200 words for a security/IT analyst. Keep concrete details:
+    systems, controls, rule or log patterns, counts, and anything that looks like a risk.
+    Keep placeholders such as <EMAIL> or <FULL_NAME> exactly as written; do not invent details.
+    ---
+    {chunk}
+    """
+
+
+def summarize_chunks(chunks, kind, workers=PROMPT_MAP_WORKERS, model=None, cache_mode="use", content_hash=None) -> list:
+    """Summarize chunks concurrently; summaries come back in chunk order.
+
+    Summaries are kept in the unit store by chunk content (the part number in the
+    prompt is left out of the key), so unchanged chunks of a revised document
+    are not summarized again (cache_mode and content_hash as for
+    unit_store.load_unit/save_unit). Under a request deadline, summaries not back in
+    time are cancelled and replaced by the start of their chunk.
+    """
+    model = model or get_client()
+    total = len(chunks)
+    settings = f"{model.backend}:{model.model_name}:{SUMMARY_VERSION}"
+
+    def summarize(args):
+        index, chunk = args
+        key = unit_key(hash_bytes(f"{kind}\n{chunk}".encode("utf-8")), "summary", settings)
+        stored = load_unit(key, cache_mode, content_hash)
+        if stored is not None:
+            return stored["text"]
+        summary = model.generate_content(_summary_prompt(chunk, kind, index, total)).text.strip()
+        save_unit(key, {"text": summary}, cache_mode, content_hash)
+        return summary
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, total)))
+    try:
+        # Each call runs in a copy of this thread's context so its spans and deadline keep the request's
+        futures = [
+            pool.submit(contextvars.copy_context().run, summarize, args)
+            for args in enumerate(chunks, start=1)
+        ]
+        summaries, missed = [], 0
+        for chunk, future in zip(chunks, futures):
+            try:
+                summaries.append(future.result(timeout=extraction_time_left()))
+            except (FuturesTimeout, BudgetExceeded):
+                future.cancel()
+                summaries.append(chunk[:SUMMARY_FALLBACK_CHARS])
+                missed += 1
+        if missed:
+            mark_partial("summarize", chunks=missed, of=total)
+        return summaries
+    finally:
+        # Don't wait for calls still running past the deadline; their timeouts bound them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def build_content(text: str, fmt: str, budget: int = None, model=None, cache_mode="use", content_hash=None) -> str:
+    """Fit extracted text into the format's token budget.
+
+    De-duplicates first; if still too large, summarizes chunks in parallel and
+    joins the partial summaries (repeating on the summaries if needed).
+    """
+    budget = budget or PROMPT_BUDGETS[fmt]
+    kind = KIND_NAMES.get(fmt, "document")
+    with span("prompt") as prompt_span:
+        content = dedupe_text(text)
+        rounds = 0
+        while estimate_tokens(content) > budget and rounds < PROMPT_MAX_ROUNDS:
+            left = extraction_time_left()
+            if left is not None and left <= 0:
+                mark_partial("summarize", rounds=rounds)
+                break
+            report_stage("summarizing")
+            chunks = chunk_text(content, min(PROMPT_CHUNK_TOKENS, budget))
+            summaries = summarize_chunks(chunks, kind, model=model, cache_mode=cache_mode, content_hash=content_hash)
+            content = "\n\n".join(f"[Part {i} of {len(summaries)}]\n{s}" for i, s in enumerate(summaries, start=1))
+            kind = f"set of partial summaries of a {kind}"
+            rounds += 1
+        if estimate_tokens(content) > budget:
+            content = content[:budget * CHARS_PER_TOKEN]
+        prompt_span["rounds"] = rounds
+    return content
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import tempfile
+
+# ------------------- Configuration -------------------
+# Uploads up to this size stay in memory; larger ones spill to a temp file
+SPOOL_MEMORY_BYTES = int(os.environ.get("SPOOL_MEMORY_BYTES", 16 * 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+# ------------------- Spooled uploads -------------------
+class SpooledUpload:
+    """An uploaded file read once: hashed while streaming, kept in memory or in a temp file.
+
+    Extractors get `source()`: a BytesIO over the in-memory bytes, or the temp
+    file's path once spilled. Call close() (or use as a context manager) to
+    delete the temp file.
+    """
+
+    def __init__(self, filename, data=None, path=None, sha256=None, size=0):
+        self.filename = filename
+        self.data = data
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    @property
+    def in_memory(self):
+        return self.data is not None
+
+    def source(self):
+        """A fresh reader for extractors: BytesIO (shares the bytes, no copy) or a path."""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return self.path
+
+    def close(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SpoolingStream(io.RawIOBase):
+    """Writable upload container: hashes bytes as they are written, in memory then a temp file.
+
+    The servers' form parsers write each uploaded file straight into one (see
+    upload_stream_factory), so the body is read off the socket once and never
+    copied back out; detach() then hands the bytes or temp file to a SpooledUpload.
+    """
+
+    def __init__(self, filename="", max_bytes=MAX_UPLOAD_BYTES, memory_bytes=SPOOL_MEMORY_BYTES):
+        super().__init__()
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._buffer = io.BytesIO()
+        self._spill = None
+
+    @property
+    def _file(self):
+        return self._buffer if self._spill is None else self._spill
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self.digest.update(data)
+        if self._spill is None and self.size > self.memory_bytes:
+            suffix = os.path.splitext(self.filename)[1]
+            self._spill = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
+            self._spill.write(self._buffer.getbuffer())
+            self._buffer = None
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def detach(self, filename=None) -> SpooledUpload:
+        """Hand the spooled bytes (no copy) or temp file over to a SpooledUpload."""
+        filename = filename or self.filename
+        sha256 = self.digest.hexdigest()
+        if self._spill is not None:
+            self._spill.close()
+            upload = SpooledUpload(filename, path=self._spill.name, sha256=sha256, size=self.size)
+        else:
+            upload = SpooledUpload(filename, data=self._buffer.getvalue(), sha256=sha256, size=self.size)
+        self._buffer = self._spill = None
+        super().close()
+        return upload
+
+    def close(self):
+        # Not detached (e.g. the request failed or ended first): drop the temp file
+        if self._spill is not None:
+            self._spill.close()
+            if os.path.exists(self._spill.name):
+                os.remove(self._spill.name)
+        self._buffer = self._spill = None
+        super().close()
+
+
+def upload_stream_factory(total_content_length, content_type, filename=None, content_length=None):
+    """Form-parser stream factory (Werkzeug/Quart signature): spool uploads in a SpoolingStream."""
+    return SpoolingStream(filename or "")
+
+
+def spool_upload(stream, filename, max_bytes=MAX_UPLOAD_BYTES, memory_bytes=SPOOL_MEMORY_BYTES):
+    """SpooledUpload for an upload stream, with its SHA-256.
+
+    A SpoolingStream filled by the form parser is taken over as-is; any other
+    stream is read through one.
+    """
+    if isinstance(stream, SpoolingStream):
+        return stream.detach(filename)
+    spool = SpoolingStream(filename, max_bytes, memory_bytes)
+    try:
+        for chunk in iter(lambda: stream.read(READ_CHUNK_BYTES), b""):
+            spool.write(chunk)
+        return spool.detach()
+    finally:
+        spool.close()
+
+
+def source_path(source, tmp_dir, suffix=""):
+    """Path for tools that need one (poppler, PowerPoint): the path itself, or a temp copy of a stream."""
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=tmp_dir)
+    with os.fdopen(fd, "wb") as f:
+        source.seek(0)
+        f.write(source.getbuffer() if isinstance(source, io.BytesIO) else source.read())
+    return path
@@ -0,0 +1,220 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ------------------- Configuration -------------------
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of DEBUG/INFO records written; warnings and errors are always written
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upload sizes are bucketed so the size label stays low-cardinality
+SIZE_CLASSES = ((1024 * 1024, "lt_1mb"), (10 * 1024 * 1024, "1_10mb"), (float("inf"), "gt_10mb"))
+
+# file_type/size of the request being handled; flows into threads via contextvars
+_request = contextvars.ContextVar("request", default=None)
+
+
+# ------------------- Logging -------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, event and any fields passed to log_event."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        request = _request.get()
+        if request:
+            entry.update(request)
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+log = logging.getLogger("optiv")
+if not log.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter())
+    _handler.addFilter(SampleFilter(LOG_SAMPLE_RATE))
+    log.addHandler(_handler)
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+
+
+def log_event(level, event: str, **fields):
+    """Structured log record, e.g. log_event(logging.INFO, "request_done", seconds=1.2)."""
+    if log.isEnabledFor(level):
+        log.log(level, event, extra={"fields": fields})
+
+
+# ------------------- Metrics -------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+_metrics = []
+
+
+def counter(name, help_text, labels=()) -> Counter:
+    metric = Counter(name, help_text, labels)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name, help_text, labels=(), buckets=DURATION_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = histogram(
+    "optiv_stage_duration_seconds", "Time spent per pipeline stage.", ("stage", "file_type", "size", "status")
+)
+REQUESTS = counter("optiv_requests_total", "Analyzed files.", ("file_type",))
+CACHE_LOOKUPS = counter("optiv_cache_lookups_total", "Result cache lookups.", ("cache", "result"))
+ERRORS = counter("optiv_errors_total", "Failures, each counted once where handled.", ("stage", "file_type"))
+BYTES_PROCESSED = counter("optiv_bytes_processed_total", "Upload bytes run through extraction.", ("file_type",))
+PARTIAL_RESULTS = counter("optiv_partial_results_total", "Stages cut short by a request deadline.", ("stage",))
+
+
+def record_error(stage: str, error, **fields):
+    """Count and log a failure that was handled (the caller carries on)."""
+    request = _request.get() or {}
+    ERRORS.inc(stage=stage, file_type=fields.pop("file_type", request.get("file_type", "unknown")))
+    log_event(logging.WARNING, f"{stage}_failed", error=f"{type(error).__name__}: {error}", **fields)
+
+
+# ------------------- Spans -------------------
+def size_class(size) -> str:
+    for limit, name in SIZE_CLASSES:
+        if size < limit:
+            return name
+    return SIZE_CLASSES[-1][1]
+
+
+@contextmanager
+def request_context(file_type: str, size: int):
+    """Tag spans and log records inside the block with the file type and size."""
+    token = _request.set({"file_type": file_type, "bytes": size})
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a stage into optiv_stage_duration_seconds and log it at DEBUG.
+
+    Exceptions are re-raised and only mark the stage's status ("error", or
+    "deadline" for a spent request budget); counting a failure is left to
+    whoever handles it (record_error), so each counts once however many spans
+    it passes through. Fields added to the yielded dict (e.g. page counts, or
+    file_type/bytes outside a request context) go into the log record.
+    """
+    request = _request.get() or {}
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException as e:
+        status = "deadline" if type(e).__name__ == "BudgetExceeded" else "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        file_type = fields.pop("file_type", request.get("file_type", "unknown"))
+        size = fields.pop("bytes", request.get("bytes"))
+        STAGE_SECONDS.observe(
+            seconds, stage=stage, file_type=file_type, size=size_class(size) if size is not None else "unknown",
+            status=status,
+        )
+        log_event(
+            logging.DEBUG, "span", stage=stage, seconds=round(seconds, 4), status=status,
+            file_type=file_type, bytes=size, **fields,
+        )
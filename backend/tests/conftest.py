@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Offline and isolated before any backend module is imported: the stub model,
+# and throwaway SQLite stores instead of the ones next to the code
+_store_dir = tempfile.mkdtemp(prefix="optiv_tests_")
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STUB_LLM_LATENCY"] = "0"
+for name in ("RESULT_CACHE_DB", "IMAGE_INDEX_DB", "TEXT_INDEX_DB", "UNIT_STORE_DB"):
+    os.environ[name] = os.path.join(_store_dir, name.lower() + ".sqlite3")
+
+# Backend modules import each other by plain name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+import pytest
+
+import ai
+from llm_stub import StubModel
+
+PROMPT = "Firewall rule export with 120 allow rules between DMZ and app tier."
+
+
+@pytest.mark.parametrize("mode, structured_ok, calls", [
+    ("two-call", True, 2),
+    ("structured", True, 1),
+    # Unparseable JSON falls back to the two sequential calls
+    ("structured", False, 3),
+])
+def test_model_calls_per_mode(monkeypatch, mode, structured_ok, calls):
+    monkeypatch.setattr(ai, "AI_RESPONSE_MODE", mode)
+    model = StubModel(latency=0, structured_ok=structured_ok)
+    description, findings = ai.describe_and_find(model, PROMPT)
+    assert model.calls == calls
+    assert description.startswith("Stub Document")
+    assert findings.splitlines() == [
+        "- Stub finding about the system's purpose.",
+        "- Stub finding about a potential vulnerability.",
+    ]
+
+
+def test_structured_mode_keeps_image_parts(monkeypatch):
+    monkeypatch.setattr(ai, "AI_RESPONSE_MODE", "structured")
+    contents = ai._structured_contents([PROMPT, "<image>"])
+    assert contents[0].startswith(PROMPT) and contents[1:] == ["<image>"]
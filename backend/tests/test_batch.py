@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS = os.path.join(BACKEND, "uploads")
+
+
+def run_batch(input_dir, output, *args):
+    """batch.py in a fresh interpreter (its extraction pool forks), with a hard timeout."""
+    return subprocess.run(
+        [sys.executable, "batch.py", str(input_dir), str(output), "--workers", "2", *args],
+        cwd=BACKEND, capture_output=True, text=True, timeout=120,
+    )
+
+
+def read_results(output):
+    with open(output, encoding="utf-8") as f:
+        return {os.path.basename(record["path"]): record for record in map(json.loads, f)}
+
+
+@pytest.fixture
+def evidence(tmp_path):
+    folder = tmp_path / "evidence"
+    folder.mkdir()
+    shutil.copy(os.path.join(UPLOADS, "File_014.pptx"), folder / "deck.pptx")
+    shutil.copy(os.path.join(UPLOADS, "File_012.pdf"), folder / "report.xlsx")  # mislabelled
+    shutil.copy(os.path.join(UPLOADS, "File_002.png"), folder / "photo.jpg")
+    (folder / "notes.pdf").write_bytes(b"not a pdf at all")
+    (folder / "readme.txt").write_text("skipped: not a supported extension")
+    return folder
+
+
+def test_batch_types_files_by_content_and_finishes(evidence, tmp_path):
+    output = tmp_path / "out.jsonl"
+    done = run_batch(evidence, output)
+    # Exits (with a summary) once every file is recorded, even with PDFs and decks in the run
+    assert done.returncode == 1, done.stderr
+    assert "Processed 4 file(s)" in done.stdout and "ok=3 failed=1" in done.stdout
+    results = read_results(output)
+    assert set(results) == {"deck.pptx", "report.xlsx", "photo.jpg", "notes.pdf"}
+    assert results["report.xlsx"]["file_type"] == "PDF" and results["report.xlsx"]["status"] == "ok"
+    assert results["deck.pptx"]["file_type"] == "PPT" and results["deck.pptx"]["status"] == "ok"
+    assert results["notes.pdf"]["error"] == "extract: Unsupported file type"
+
+    # A rerun only retries the failure
+    again = run_batch(evidence, output)
+    assert "skipped=3" in again.stdout
@@ -0,0 +1,69 @@
+import pytest
+
+import cache
+from cache import ResultCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+def new_cache(tmp_path, **kwargs):
+    return ResultCache(db_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_roundtrip_through_disk(tmp_path):
+    first = new_cache(tmp_path)
+    first.set("k", {"file_description": "d", "key_findings": "f"})
+    # A fresh instance has an empty memory tier and reads SQLite
+    assert new_cache(tmp_path).get("k") == {"file_description": "d", "key_findings": "f"}
+    assert first.get("missing") is None
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    results = new_cache(tmp_path, ttl=60)
+    results.set("k", "v")
+    clock[0] += 60
+    assert results.get("k") == "v"
+    clock[0] += 1
+    assert results.get("k") is None
+    assert new_cache(tmp_path, ttl=60).get("k") is None
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    results = new_cache(tmp_path, memory_entries=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    results.get("a")
+    results.set("c", 3)
+    assert list(results._memory) == ["a", "c"]
+    # Still on disk
+    assert results.get("b") == 2
+
+
+def test_disk_tier_evicts_least_recently_accessed(tmp_path, clock):
+    value = "x" * 100
+    results = new_cache(tmp_path, memory_entries=0, disk_max_bytes=250)
+    results.set("a", value)
+    clock[0] += 1
+    results.set("b", value)
+    clock[0] += 1
+    results.get("a")
+    clock[0] += 1
+    results.set("c", value)
+    assert results.get("b") is None
+    assert results.get("a") == value and results.get("c") == value
+
+
+def test_invalidate_hash_drops_every_type_and_version(tmp_path):
+    results = new_cache(tmp_path)
+    results.set(make_key("abc", "PDF", "1"), "one")
+    results.set(make_key("abc", "PDF", "2"), "two")
+    results.set(make_key("abd", "PDF", "1"), "other")
+    results.invalidate_hash("abc")
+    assert results.get(make_key("abc", "PDF", "1")) is None
+    assert results.get(make_key("abc", "PDF", "2")) is None
+    assert results.get(make_key("abd", "PDF", "1")) == "other"
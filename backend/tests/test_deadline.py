@@ -0,0 +1,128 @@
+import io
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app
+import deadline
+import pipeline
+import prompt_builder
+from deadline import (
+    BudgetExceeded, call_timeout, deadline_scope, extraction_time_left, is_partial, mark_partial,
+    out_of_extraction_time, remaining, request_budget,
+)
+from spool import spool_upload
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+# ------------------- Deadline -------------------
+def test_no_deadline_means_no_limits():
+    with deadline_scope(0) as current:
+        assert current is None
+        assert remaining() is None and extraction_time_left() is None and not out_of_extraction_time()
+        assert call_timeout(30) == 30 and call_timeout(None) is None
+        mark_partial("pdf_text", pages=[1])  # nothing to record it on
+        assert not is_partial()
+
+
+def test_extraction_leaves_the_reserve_to_the_model_calls():
+    with deadline_scope(100) as current:
+        assert current.reserve == 100 * deadline.DEADLINE_LLM_RESERVE
+        assert remaining() - extraction_time_left() == pytest.approx(current.reserve, abs=0.01)
+        assert call_timeout(30) == 30
+        assert call_timeout(1000) == pytest.approx(100, abs=0.1)
+        assert call_timeout(None) == pytest.approx(100, abs=0.1)
+
+
+def test_spent_budget_stops_model_calls():
+    with deadline_scope(0.01):
+        time.sleep(0.02)
+        assert remaining() == 0 and out_of_extraction_time()
+        with pytest.raises(BudgetExceeded):
+            call_timeout(30)
+    assert remaining() is None
+
+
+def test_partial_stages_are_recorded_per_request():
+    with deadline_scope(60) as current:
+        assert not is_partial()
+        mark_partial("ocr", pages=[2, 3])
+        assert is_partial() and current.skipped == [{"stage": "ocr", "pages": [2, 3]}]
+        with deadline_scope(60):
+            assert not is_partial()
+    assert not is_partial()
+
+
+@pytest.mark.parametrize("args, expected", [
+    ({}, 120), ({"budget": "30"}, 30), ({"budget": "500"}, 120), ({"budget": "soon"}, 120), ({"budget": "-1"}, 120),
+])
+def test_request_budget_can_only_lower_the_limit(monkeypatch, args, expected):
+    monkeypatch.setattr(deadline, "REQUEST_BUDGET_SECONDS", 120)
+    assert request_budget(args) == expected
+
+
+def test_request_budget_without_a_configured_limit(monkeypatch):
+    monkeypatch.setattr(deadline, "REQUEST_BUDGET_SECONDS", 0)
+    assert request_budget({"budget": "500"}) == 500 and request_budget({}) == 0
+
+
+# ------------------- Partial results -------------------
+class SlowModel:
+    backend, model_name = "fake", "slow"
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def generate_content(self, prompt):
+        time.sleep(self.seconds)
+        return SimpleNamespace(text="summary")
+
+
+def test_summaries_not_back_in_time_fall_back_to_their_chunk():
+    chunks = [f"chunk {i} " + "x" * 500 for i in range(3)]
+    start = time.monotonic()
+    with deadline_scope(0.4) as current:
+        summaries = prompt_builder.summarize_chunks(chunks, "document", model=SlowModel(2), cache_mode="bypass")
+    assert time.monotonic() - start < 1.5
+    assert summaries == [chunk[:prompt_builder.SUMMARY_FALLBACK_CHARS] for chunk in chunks]
+    assert current.skipped == [{"stage": "summarize", "chunks": 3, "of": 3}]
+
+
+def test_no_text_is_a_budget_error_only_when_extraction_was_cut_short():
+    with deadline_scope(60):
+        with pytest.raises(ValueError) as error:
+            pipeline.require_text("", "PDF")
+        assert not isinstance(error.value, BudgetExceeded)
+        mark_partial("pdf_text", pages=[1])
+        with pytest.raises(BudgetExceeded):
+            pipeline.require_text("", "PDF")
+        pipeline.require_text("some text", "PDF")
+
+
+def test_partial_results_are_not_cached(monkeypatch):
+    stored = []
+    monkeypatch.setattr(pipeline.result_cache, "set", lambda key, value: stored.append(key))
+    with deadline_scope(60):
+        pipeline.store_result("complete", "use", "d", "f")
+        mark_partial("ocr", pages=[1])
+        pipeline.store_result("partial", "use", "d", "f")
+    assert stored == ["complete"]
+
+
+def test_spent_budget_on_a_pdf_is_a_budget_error():
+    with open(os.path.join(UPLOADS, "File_012.pdf"), "rb") as f, spool_upload(f, "report.pdf") as upload:
+        with pytest.raises(BudgetExceeded):
+            pipeline.analyze_file(upload, "PDF", "bypass", budget=1e-6)
+
+
+def test_budget_errors_are_504(monkeypatch):
+    def out_of_time(*args):
+        raise BudgetExceeded("Request budget exhausted")
+
+    monkeypatch.setattr(app, "analyze_file", out_of_time)
+    response = app.app.test_client().post("/upload?budget=5", data={"file": (io.BytesIO(b"%PDF-1.4\n"), "a.pdf")})
+    assert response.status_code == 504
+    assert response.get_json() == {"error": "Request budget exhausted"}
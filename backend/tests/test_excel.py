@@ -0,0 +1,119 @@
+import pytest
+from openpyxl import Workbook
+
+import excel
+
+
+def make_workbook(path, sheets):
+    """Write {sheet name: rows} (first row the header) to an .xlsx file."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def access_log(tmp_path):
+    return make_workbook(tmp_path / "log.xlsx", {
+        "Users": [
+            ["User", "Email", "Id", None, "Id"],
+            ["Sarah Thompson", "sarah@corp.com", "EMP1001", "x", 1],
+            [None, None, None, None, None],
+            ["Raj Patel", "raj@corp.com", "EMP1002"],  # ragged: shorter than the header
+            ["Ann Lee", "ann@corp.com", "EMP1003", "y", 3, "beyond the header"],
+        ],
+        "Tokens": [["Serial", "Owner"]] + [[f"HT-{i}-AB", "ops"] for i in range(7)],
+        "Empty": [],
+    })
+
+
+def test_chunks_cover_every_sheet_within_the_row_limit(access_log):
+    chunks = list(excel.iter_sheet_chunks(access_log, chunk_rows=3))
+    assert [(name, len(chunk)) for name, chunk in chunks] == [("Users", 3), ("Tokens", 3), ("Tokens", 3), ("Tokens", 1)]
+
+
+def test_rows_are_padded_and_blank_rows_dropped(access_log):
+    (_, users), *_ = excel.iter_sheet_chunks(access_log, mask=False)
+    # Blank and duplicate header cells (and cells past the header) are named as pandas.read_excel names them
+    assert list(users.columns) == ["User", "Email", "Id", "Unnamed: 3", "Id.1", "Unnamed: 5"]
+    assert users["User"].tolist() == ["Sarah Thompson", "Raj Patel", "Ann Lee"]
+    assert users.iloc[1].tolist()[3:] == [None, None, None]
+    assert users.iloc[2].tolist()[5] == "beyond the header"
+
+
+def test_chunks_are_masked_column_wise(access_log):
+    (_, users), (_, tokens), *_ = excel.iter_sheet_chunks(access_log)
+    assert set(users["User"]) == {"<FULL_NAME>"}
+    assert set(users["Email"]) == {"<EMAIL>"}
+    assert set(users["Id"]) == {"<EMPLOYEE_ID>"}
+    assert users["Unnamed: 3"].tolist() == ["x", "", "y"]  # empty cells become ""
+    assert set(tokens["Serial"]) == {"<TOKEN_SERIAL>"}
+
+
+def test_stream_renders_each_sheet_once_with_its_header(access_log):
+    text = excel.stream_excel_file(access_log, chunk_rows=3)
+    assert text.count("Sheet: Users") == 1 and text.count("Sheet: Tokens") == 1
+    assert "Sheet: Empty" not in text
+    assert text.count("Serial") == 1  # header only on the sheet's first chunk
+    assert text.count("<TOKEN_SERIAL>") == 7
+    assert "Sarah" not in text and "@corp.com" not in text
+
+
+def test_stream_matches_the_frame_mode_on_a_single_sheet(tmp_path):
+    path = make_workbook(tmp_path / "one.xlsx", {
+        "Sheet1": [["Name", "Note"], ["Sarah Thompson", "badge EMP42"], ["Raj Patel", "ok"]],
+    })
+    streamed = excel.process_excel_file(path, mode="stream", prompt_mode="rows")
+    framed = excel.process_excel_file(path, mode="frame")
+    assert streamed == "Sheet: Sheet1\n" + framed
+
+
+# ------------------- Column profiles -------------------
+@pytest.fixture
+def big_log(tmp_path):
+    rows = [["Source IP", "User", "Action", "Bytes", "When"]]
+    for i in range(600):
+        rows.append([
+            f"10.0.0.{i % 50}", f"EMP{1000 + i % 7}", "DENIED" if i % 100 == 0 else "ALLOWED",
+            i * 10, f"2024-03-{1 + i % 28:02d} 09:{i % 60:02d}",
+        ])
+    return make_workbook(tmp_path / "big.xlsx", {"Access": rows, "Owners": [["Full Name"], ["Sarah Thompson"]]})
+
+
+def test_auto_mode_profiles_large_sheets_and_renders_small_ones(big_log):
+    text = excel.summarize_excel_file(big_log, "auto", min_rows=500, chunk_rows=100)
+    access, owners = text.split("\n\nSheet: ")
+    assert access.startswith("Sheet: Access\nColumn profile of all 600 rows x 5 columns")
+    assert owners.split("\n") == ["Owners", "  Full Name", "<FULL_NAME>"]
+
+
+def test_profile_describes_columns_with_values_masked_and_headers_kept(big_log):
+    access = excel.summarize_excel_file(big_log, "profile", chunk_rows=100).split("\n\nSheet: ")[0]
+    lines = {line.split(":")[0]: line for line in access.splitlines() if line.startswith("- ")}
+    # "Source IP" would read as a FULL_NAME if headers were masked
+    assert set(lines) == {"- Source IP", "- User", "- Action", "- Bytes", "- When"}
+    assert "<EMPLOYEE_ID> (600)" in lines["- User"] and "EMP1" not in lines["- User"]
+    assert "7 distinct" in lines["- User"]
+    assert lines["- Action"].endswith("top: ALLOWED (594), DENIED (6)")
+    assert "integer" in lines["- Bytes"] and "range 0 .. 5990" in lines["- Bytes"] and "mean 2,995.00" in lines["- Bytes"]
+    # Timestamps exported as text are read as dates
+    assert lines["- When"].startswith("- When: date/time") and "range 2024-03-01 09:00:00 .. 2024-03-28" in lines["- When"]
+
+
+def test_profile_sample_is_stratified_and_stable(big_log):
+    text = excel.summarize_excel_file(big_log, "profile", chunk_rows=100)
+    sample = text.split("Sample of ")[1]
+    assert sample.startswith("20 rows (stratified by Action):")
+    assert "DENIED" in sample  # the rare category is represented
+    assert "EMP1" not in sample
+    assert excel.summarize_excel_file(big_log, "profile", chunk_rows=250) == text
+
+
+def test_text_date_detection_needs_nearly_every_value():
+    column = excel.ColumnProfile("Mixed")
+    column.update(excel.pd.Series(["2024-03-01"] * 8 + ["n/a", "pending"], dtype=object))
+    assert column.kind == "text" and column.range_kind is None
@@ -0,0 +1,41 @@
+import io
+import os
+
+import pytest
+
+from extractors import OLE2_MAGIC, sniff_file_type
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+@pytest.mark.parametrize("name, file_type", [
+    ("File_002.png", "Image"),
+    ("File_008.xlsx", "Excel"),
+    ("File_012.pdf", "PDF"),
+    ("File_014.pptx", "PPT"),
+])
+def test_sniffs_fixtures_by_content(name, file_type):
+    path = os.path.join(UPLOADS, name)
+    assert sniff_file_type(path) == file_type
+    with open(path, "rb") as f:
+        stream = io.BytesIO(f.read())
+    stream.seek(0)
+    # Whatever the extension claims, and without moving the stream
+    assert sniff_file_type(stream, "txt") == file_type
+    assert stream.tell() == 0
+
+
+def test_jpeg_magic():
+    assert sniff_file_type(io.BytesIO(b"\xff\xd8\xff\xe0" + b"\0" * 16)) == "Image"
+
+
+def test_legacy_ole2_uses_the_extension():
+    stream = io.BytesIO(OLE2_MAGIC + b"\0" * 64)
+    assert sniff_file_type(stream, "xls") == "Excel"
+    assert sniff_file_type(stream, "PPT") == "PPT"
+    assert sniff_file_type(stream, "pdf") is None
+
+
+def test_unknown_content():
+    assert sniff_file_type(io.BytesIO(b"just some text")) is None
+    assert sniff_file_type(io.BytesIO(b"PK\x03\x04not really a zip")) is None
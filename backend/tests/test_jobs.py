@@ -0,0 +1,78 @@
+import os
+import threading
+
+import pytest
+
+import app
+from jobs import Job, JobManager, JobQueueFull
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+@pytest.fixture
+def busy_manager(monkeypatch):
+    """A one-worker, one-slot job manager whose worker is stuck and whose queue is full."""
+    release = threading.Event()
+    manager = JobManager(workers=1, max_queue=1)
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    manager.submit("running", block)
+    started.wait(5)
+    manager.submit("queued", release.wait, 5)
+    monkeypatch.setattr(app, "job_manager", manager)
+    yield manager
+    release.set()
+
+
+def test_submit_raises_when_the_queue_is_full(busy_manager):
+    with pytest.raises(JobQueueFull):
+        busy_manager.submit("extra", lambda: None)
+    assert busy_manager.queue_depth() == 1
+
+
+@pytest.mark.parametrize("url", ["/upload?async=1", "/upload/stream"])
+def test_full_queue_answers_503_with_retry_after(busy_manager, url):
+    with open(os.path.join(UPLOADS, "File_008.xlsx"), "rb") as f:
+        response = app.app.test_client().post(url, data={"file": (f, "File_008.xlsx")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(app.JOB_RETRY_AFTER)
+    assert "queue is full" in response.get_json()["error"]
+
+
+def test_job_runs_and_reports_its_result():
+    manager = JobManager(workers=1)
+    job = manager.submit("f", lambda a, b: a + b, 2, 3)
+    events = [event["event"] for event in app.iter_job_events(job)]
+    assert events == ["queued", "running", "done"]
+    assert job.to_dict()["result"] == 5
+    assert manager.get(job.id) is job
+
+
+def test_failed_job_reports_its_error():
+    manager = JobManager(workers=1)
+
+    def fail():
+        raise ValueError("broken")
+
+    job = manager.submit("f", fail)
+    events = list(app.iter_job_events(job))
+    assert events[-1]["event"] == "error" and events[-1]["error"] == "broken"
+    assert job.to_dict()["status"] == "error"
+
+
+def test_finished_flag_comes_with_the_last_event():
+    # A reader must never see the job finished without its done event
+    for i in range(500):
+        job = Job(str(i), "f")
+        worker = threading.Thread(target=job.complete, args=("result",))
+        worker.start()
+        sent, finished = 0, False
+        while not finished:
+            events, finished = job.wait_events(sent, timeout=1)
+            sent += len(events)
+        worker.join()
+        assert job.events[sent - 1]["event"] == "done"
@@ -0,0 +1,251 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm
+from deadline import BudgetExceeded, deadline_scope
+from llm import LLMClient, LLMRateLimited, TokenBucket
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core error, so the client retries it."""
+
+
+class FakeModel:
+    """Answers with its contents; fails with the queued errors first; can hold calls until released."""
+
+    def __init__(self, errors=(), gate=None):
+        self.errors = list(errors)
+        self.gate = gate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs):
+        with self._lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        if self.gate is not None:
+            self.gate.wait(5)
+        if error is not None:
+            raise error
+        return f"answer to {contents}"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(llm.time, "sleep", delays.append)
+    return delays
+
+
+def client_for(monkeypatch, model, **kwargs):
+    monkeypatch.setitem(llm.BACKENDS, "fake", lambda model_name: model)
+    return LLMClient(backend="fake", **kwargs)
+
+
+# ------------------- Token bucket -------------------
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+    clock[0] += 0.5  # one token at 2/s
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    clock[0] += 60  # refills up to the burst size, no further
+    assert sum(bucket.acquire(timeout=0) for _ in range(5)) == 3
+
+
+def test_bucket_waits_for_the_next_token(clock, monkeypatch):
+    def sleep(seconds):
+        clock[0] += seconds
+
+    monkeypatch.setattr(llm.time, "sleep", sleep)
+    bucket = TokenBucket(rate=4, burst=1)
+    assert bucket.acquire()
+    assert bucket.acquire(timeout=1)
+    assert clock[0] == pytest.approx(100.25)
+    assert not bucket.acquire(timeout=0.1)  # the next token is 0.25 s away
+
+
+def test_async_bucket_waits_without_blocking():
+    bucket = TokenBucket(rate=20, burst=1)
+    ticks = []
+
+    async def tick():
+        # Keeps running while the second acquire waits for its token
+        for _ in range(3):
+            ticks.append(None)
+            await asyncio.sleep(0.005)
+
+    async def take_two():
+        ticker = asyncio.create_task(tick())
+        taken = await bucket.acquire_async(), await bucket.acquire_async(timeout=1)
+        ticked = len(ticks)
+        await ticker
+        return taken, ticked
+
+    start = time.monotonic()
+    assert asyncio.run(take_two()) == ((True, True), 3)
+    assert time.monotonic() - start >= 0.04
+
+
+def test_rate_limit_wait_times_out(monkeypatch):
+    client = client_for(monkeypatch, FakeModel(), rate=0.001, burst=1, timeout=0.01)
+    client.generate_content("first")
+    with pytest.raises(LLMRateLimited):
+        client.generate_content("second")
+
+
+# ------------------- Retries -------------------
+def test_retryable_errors_back_off_and_retry(monkeypatch, sleeps):
+    model = FakeModel(errors=[ServiceUnavailable("503"), TimeoutError("slow")])
+    client = client_for(monkeypatch, model)
+    assert client.generate_content("q") == "answer to q"
+    assert model.calls == 3
+    # Full jitter under an exponentially growing cap
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= llm.LLM_BACKOFF_BASE and 0 <= sleeps[1] <= 2 * llm.LLM_BACKOFF_BASE
+
+
+def test_other_errors_are_not_retried(monkeypatch, sleeps):
+    model = FakeModel(errors=[ValueError("bad request")])
+    with pytest.raises(ValueError):
+        client_for(monkeypatch, model).generate_content("q")
+    assert model.calls == 1 and sleeps == []
+
+
+def test_retries_stop_after_max_retries(monkeypatch, sleeps):
+    model = FakeModel(errors=[ServiceUnavailable("503")] * 5)
+    with pytest.raises(ServiceUnavailable):
+        client_for(monkeypatch, model, max_retries=2).generate_content("q")
+    assert model.calls == 3 and len(sleeps) == 2
+
+
+# ------------------- Coalescing -------------------
+def run_concurrently(client, contents, count):
+    results = [None] * count
+
+    def call(i):
+        try:
+            results[i] = client.generate_content(contents[i % len(contents)])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_inflight(client, count):
+    for _ in range(500):
+        if len(client._inflight) == count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("calls never went upstream")
+
+
+def test_identical_concurrent_requests_share_one_call(monkeypatch):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = client_for(monkeypatch, model)
+    threads, results = run_concurrently(client, ["same"], 5)
+    wait_for_inflight(client, 1)
+    threading.Event().wait(0.05)  # let the followers reach the in-flight call
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert model.calls == 1
+    assert results == ["answer to same"] * 5
+    assert client._inflight == {}
+
+
+def test_different_requests_are_not_coalesced(monkeypatch):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = client_for(monkeypatch, model)
+    threads, results = run_concurrently(client, ["a", "b"], 2)
+    wait_for_inflight(client, 2)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert model.calls == 2 and sorted(results) == ["answer to a", "answer to b"]
+
+
+def test_a_failure_is_shared_with_waiting_callers(monkeypatch):
+    gate = threading.Event()
+    model = FakeModel(errors=[ValueError("bad request")], gate=gate)
+    client = client_for(monkeypatch, model)
+    threads, results = run_concurrently(client, ["same"], 3)
+    wait_for_inflight(client, 1)
+    threading.Event().wait(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert model.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_request_key_covers_contents_and_config():
+    key = llm.request_key("m", ["prompt", b"image"], {"temperature": 0})
+    assert key == llm.request_key("m", ("prompt", b"image"), {"temperature": 0})
+    assert key != llm.request_key("m", ["prompt", b"other"], {"temperature": 0})
+    assert key != llm.request_key("m", ["prompt", b"image"], {"temperature": 1})
+    assert key != llm.request_key("other", ["prompt", b"image"], {"temperature": 0})
+
+
+# ------------------- Deadlines -------------------
+def test_follower_calls_again_when_the_leader_ran_out_of_budget(monkeypatch):
+    gate = threading.Event()
+    # The leader's call fails after its budget is gone, so it is not retried
+    model = FakeModel(errors=[TimeoutError("slow")], gate=gate)
+    client = client_for(monkeypatch, model)
+    results = {}
+
+    def leader():
+        with deadline_scope(0.1):
+            try:
+                client.generate_content("same")
+            except Exception as e:
+                results["leader"] = e
+
+    def follower():
+        results["follower"] = client.generate_content("same")  # no deadline of its own
+
+    first = threading.Thread(target=leader)
+    first.start()
+    wait_for_inflight(client, 1)
+    second = threading.Thread(target=follower)
+    second.start()
+    threading.Event().wait(0.2)  # past the leader's deadline
+    gate.set()
+    first.join()
+    second.join()
+    assert isinstance(results["leader"], BudgetExceeded)
+    assert results["follower"] == "answer to same" and model.calls == 2
+
+
+def test_follower_waits_no_longer_than_its_own_budget(monkeypatch):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    client = client_for(monkeypatch, model)
+    threads, results = run_concurrently(client, ["same"], 1)
+    wait_for_inflight(client, 1)
+    start = time.monotonic()
+    with deadline_scope(0.1):
+        with pytest.raises(BudgetExceeded):
+            client.generate_content("same")
+    assert time.monotonic() - start < 1
+    gate.set()
+    threads[0].join()
+    assert results == ["answer to same"] and model.calls == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from bench_masking import LEGACY, SAMPLE_LINES, make_text
+from masking import get_engine, mask_text
+
+PROFILES = sorted(LEGACY)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("line", SAMPLE_LINES)
+def test_matches_legacy_loops(profile, line):
+    assert mask_text(line, profile) == LEGACY[profile](line)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_matches_legacy_loops_on_mixed_text(profile):
+    # ppt masks line by line, the others see the whole text at once
+    text = make_text(0.05, seed=7)
+    assert mask_text(text, profile) == LEGACY[profile](text)
+
+
+@pytest.mark.parametrize("profile, line, expected", [
+    ("excel", "contact alice@example.com", "contact <EMAIL>"),
+    ("ppt", "Contact Sarah.Connor@corp.com", "Contact <EMAIL>"),
+    ("pdf", "Dr. Smith@corp.com", "Dr. <EMAIL>"),
+])
+def test_email_after_a_word_is_masked_whole(profile, line, expected):
+    assert mask_text(line, profile) == expected
+
+
+@pytest.mark.parametrize("profile, line, expected", [
+    # A token-like word is not a token serial, so the name rule still applies
+    ("excel", "Date HT-10.0.0.1", "<FULL_NAME>-10.0.0.1"),
+    ("excel", "EMP9-x@corp.com", "<EMPLOYEE_ID>-<EMAIL>"),
+    # Addresses run together are each masked
+    ("pdf", "a.b@corp.com_c.d@corp.com", "<EMAIL><EMAIL>"),
+    ("pdf", "ops@corp.com-sec@corp.com", "<EMAIL><EMAIL>"),
+    # Phone numbers, then IPs, then card numbers: no rule cuts into an earlier one's match
+    ("pdf", "1111 1111 1111 1.2.3.4", "<PHONE> 1111 <IP>"),
+    ("pdf", "415-555-01344111", "415-555-<PHONE>"),
+])
+def test_rules_apply_in_legacy_order(profile, line, expected):
+    assert mask_text(line, profile) == expected == LEGACY[profile](line)
+
+
+def test_ppt_keeps_line_endings():
+    # The legacy loop re-joined lines with "\n", dropping a trailing newline and "\r"
+    text = "owner: Sarah Thompson\r\ncontact a@b.com\n"
+    assert mask_text(text, "ppt") == "owner: <FULL_NAME>\r\ncontact <EMAIL>\n"
+    assert "\n".join(mask_text(text, "ppt").splitlines()) == LEGACY["ppt"](text)
+
+
+def test_ppt_masks_each_line_on_its_own():
+    # Names and phone numbers never run across a line break
+    text = "Sarah\nThompson\n415\n555-0134"
+    assert mask_text(text, "ppt") == "Sarah\nThompson\n415\n<PHONE>" == LEGACY["ppt"](text)
+
+
+def test_mask_series_matches_mask_text():
+    pd = pytest.importorskip("pandas")
+    from masking import mask_series
+    cells = SAMPLE_LINES + ["Date HT-10.0.0.1", "EMP9-x@corp.com"]
+    assert list(mask_series(pd.Series(cells), "excel")) == [mask_text(cell, "excel") for cell in cells]
+
+
+def test_chunked_masking_matches_whole_text():
+    text = make_text(0.05, seed=3)
+    assert get_engine("pdf").mask(text, chunk_size=1000) == mask_text(text, "pdf")
+
+
+def test_ppt_keeps_header_lines_and_title_words():
+    text = "Revision | Full Name | Email\nNetwork Security Review\nowner: Sarah Thompson"
+    assert mask_text(text, "ppt") == "Revision | Full Name | Email\nNetwork Security Review\nowner: <FULL_NAME>"
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+import new_pdf
+import unit_store
+from unit_store import UnitStore
+from new_pdf import classify_page, count_page_images, PDF_IMAGE_PAGE_TEXT_CHARS, PDF_MIN_TEXT_CHARS
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+
+
+def xobject(subtype, resources=None):
+    stream = StreamObject()
+    stream[NameObject("/Subtype")] = NameObject(subtype)
+    if resources is not None:
+        stream[NameObject("/Resources")] = resources
+    return stream
+
+
+def resources_with(**xobjects):
+    return DictionaryObject({
+        NameObject("/XObject"): DictionaryObject({NameObject(f"/{name}"): obj for name, obj in xobjects.items()}),
+    })
+
+
+@pytest.mark.parametrize("chars, images, mode, expected", [
+    (PDF_MIN_TEXT_CHARS - 1, 1, "auto", ("ocr", "scanned")),
+    (PDF_MIN_TEXT_CHARS - 1, 0, "auto", ("ocr", "no-text")),
+    (PDF_IMAGE_PAGE_TEXT_CHARS - 1, 2, "auto", ("ocr", "image-heavy")),
+    (PDF_IMAGE_PAGE_TEXT_CHARS, 2, "auto", ("text", "text-layer")),
+    (PDF_MIN_TEXT_CHARS, 0, "auto", ("text", "text-layer")),
+    (5000, 0, "always", ("ocr", "forced")),
+    (0, 3, "never", ("text", "forced")),
+])
+def test_classify_page(chars, images, mode, expected):
+    assert classify_page("x" * chars, images, mode) == expected
+
+
+def test_classify_page_ignores_surrounding_whitespace():
+    text = " \n" * 500 + "x" * (PDF_MIN_TEXT_CHARS - 1)
+    assert classify_page(text, 0, "auto") == ("ocr", "no-text")
+
+
+def test_count_page_images_looks_inside_forms():
+    nested = resources_with(Im1=xobject("/Image"), Fm1=xobject("/Form", resources_with(Im2=xobject("/Image"))))
+    resources = resources_with(Im0=xobject("/Image"), Fm0=xobject("/Form", nested))
+    assert count_page_images(resources) == 3
+    assert count_page_images(None) == 0
+    assert count_page_images(DictionaryObject()) == 0
+
+
+def test_fixture_pages_all_need_ocr():
+    # A short title page, then scanned pages
+    reader = PdfReader(os.path.join(UPLOADS, "File_012.pdf"))
+    paths = [
+        classify_page(page.extract_text() or "", count_page_images(page.get("/Resources")), "auto")
+        for page in reader.pages
+    ]
+    assert paths == [("ocr", "no-text")] + [("ocr", "scanned")] * (len(paths) - 1)
+
+
+def test_never_mode_skips_ocr(monkeypatch):
+    def no_ocr(*args, **kwargs):
+        raise AssertionError("OCR should not run")
+
+    monkeypatch.setattr(new_pdf, "ocr_pdf_pages", no_ocr)
+    pages = new_pdf.extract_pdf_pages(os.path.join(UPLOADS, "File_012.pdf"), mode="never")
+    report = new_pdf.page_report(pages)
+    assert report["pages"] == len(pages) > 0
+    assert report["text_pages"] == [page["page"] for page in pages] and report["ocr_pages"] == []
+
+
+# ------------------- Unit store keys -------------------
+def write_pdf(path, differences=()):
+    """One page drawing the codes "abc" in Helvetica, with the font's encoding remapping codes 97.. to differences."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(200, 200)
+    encoding = DictionaryObject({NameObject("/BaseEncoding"): NameObject("/WinAnsiEncoding")})
+    if differences:
+        encoding[NameObject("/Differences")] = ArrayObject([NumberObject(97), *map(NameObject, differences)])
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"), NameObject("/Encoding"): encoding,
+    })
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)}),
+    })
+    contents = StreamObject()
+    contents.set_data(b"BT /F1 12 Tf 20 100 Td (abc) Tj ET")
+    page[NameObject("/Contents")] = writer._add_object(contents)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def units(tmp_path, monkeypatch):
+    monkeypatch.setattr(unit_store, "unit_store", UnitStore(db_path=str(tmp_path / "units.sqlite3")))
+
+
+def test_pages_differing_only_in_font_encoding_are_not_confused(tmp_path, units):
+    plain = write_pdf(tmp_path / "plain.pdf")
+    remapped = write_pdf(tmp_path / "remapped.pdf", ["/x", "/y", "/z"])
+    first = new_pdf.extract_pdf_pages(plain, mode="never", mask=True)
+    second = new_pdf.extract_pdf_pages(remapped, mode="never", mask=True)
+    assert [page["text"] for page in first] == ["abc"]
+    assert [(page["text"], page["reused"]) for page in second] == [("xyz", False)]
+    # An unchanged page is still reused
+    again = new_pdf.extract_pdf_pages(remapped, mode="never", mask=True)
+    assert [(page["text"], page["reused"]) for page in again] == [("xyz", True)]
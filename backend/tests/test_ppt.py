@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches
+
+import ppt
+import unit_store
+from unit_store import UnitStore
+
+
+def png(color, size=(40, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture(autouse=True)
+def units(tmp_path, monkeypatch):
+    """An empty unit store per test."""
+    monkeypatch.setattr(unit_store, "unit_store", UnitStore(db_path=str(tmp_path / "units.sqlite3")))
+
+
+@pytest.fixture
+def deck():
+    """Two slides: a logo, the same logo again and a chart nested two groups deep; then the logo once more."""
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # blank
+    first = prs.slides.add_slide(layout)
+    first.shapes.add_picture(png("red"), Inches(1), Inches(1))
+    first.shapes.add_textbox(Inches(1), Inches(3), Inches(3), Inches(1)).text = "Firewall change window"
+    outer = first.shapes.add_group_shape()
+    outer.shapes.add_picture(png("red"), Inches(2), Inches(2))
+    inner = outer.shapes.add_group_shape()
+    inner.shapes.add_picture(png("blue"), Inches(3), Inches(2))
+    second = prs.slides.add_slide(layout)
+    second.shapes.add_picture(png("red"), Inches(1), Inches(1))
+    return prs
+
+
+def test_pictures_are_found_inside_nested_groups(deck):
+    first, second = deck.slides
+    images = list(ppt.iter_picture_images(first.shapes))
+    assert len(images) == 3
+    assert len({image.sha1 for image in images}) == 2
+    assert len(list(ppt.iter_picture_images(second.shapes))) == 1
+
+
+def test_each_distinct_image_is_ocrd_once(deck, monkeypatch):
+    submitted = []
+
+    def fake_ocr(blobs):
+        submitted.append(blobs)
+        return {key: f"text of {Image.open(io.BytesIO(blob)).getpixel((0, 0))}" for key, blob in blobs.items()}
+
+    monkeypatch.setattr(ppt, "ocr_image_blobs", fake_ocr)
+    stats = {}
+    texts = ppt.ocr_ppt_images(deck, stats)
+    # The repeated logo is sent once; texts follow first appearance
+    assert len(submitted) == 1 and len(submitted[0]) == 2
+    assert texts == ["text of (255, 0, 0)", "text of (0, 0, 255)"]
+    assert stats == {"images": 2, "reused_images": 0}
+
+
+def test_ocr_text_is_reused_from_the_unit_store(deck, monkeypatch):
+    monkeypatch.setattr(ppt, "ocr_image_blobs", lambda blobs: {key: "owner: Sarah Thompson" for key in blobs})
+    ppt.ocr_ppt_images(deck)
+    monkeypatch.setattr(ppt, "ocr_image_blobs", lambda blobs: blobs and pytest.fail("images were OCR'd again"))
+    stats = {}
+    assert ppt.ocr_ppt_images(deck, stats) == ["owner: <FULL_NAME>"] * 2
+    assert stats == {"images": 2, "reused_images": 2}
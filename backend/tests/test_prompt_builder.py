@@ -0,0 +1,33 @@
+from prompt_builder import CHARS_PER_TOKEN, chunk_text, dedupe_text
+
+
+def make_lines(count, tag="row"):
+    return [f"{tag} {i}: allow tcp/443 from 10.0.{i % 256}.{i % 7} to app tier" for i in range(count)]
+
+
+def test_chunks_rejoin_to_the_text_within_the_limit():
+    text = "\n".join(make_lines(2000))
+    chunks = chunk_text(text, chunk_tokens=500)
+    assert "\n".join(chunks) == text
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 * CHARS_PER_TOKEN for chunk in chunks)
+
+
+def test_long_lines_are_hard_wrapped():
+    chunks = chunk_text("a" * 5000, chunk_tokens=250)
+    assert [len(chunk) for chunk in chunks] == [1000] * 5
+
+
+def test_boundaries_follow_content_not_offsets():
+    lines = make_lines(4000)
+    before = chunk_text("\n".join(lines), chunk_tokens=500)
+    # An insertion near the start only changes the chunks around it
+    edited = lines[:100] + make_lines(30, tag="inserted") + lines[100:]
+    after = chunk_text("\n".join(edited), chunk_tokens=500)
+    unchanged = set(before) & set(after)
+    assert len(unchanged) >= len(before) - 3
+
+
+def test_dedupe_drops_repeated_blocks_and_lines():
+    text = "Header\nbody one\n\nFooter page\n\nHeader\nbody two\n\nfooter  PAGE"
+    assert dedupe_text(text) == "Header\nbody one\n\nFooter page\n\nbody two"
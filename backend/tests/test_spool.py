@@ -0,0 +1,74 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import pytest
+
+import app
+import spool
+from spool import SpoolingStream, UploadTooLarge, spool_upload
+
+DATA = os.urandom(3000)
+
+
+@pytest.fixture
+def tmp_dir(tmp_path, monkeypatch):
+    """Temp files land here, so the tests can see what is left behind."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def test_small_upload_stays_in_memory(tmp_dir):
+    with spool_upload(io.BytesIO(DATA), "a.pdf", memory_bytes=4096) as upload:
+        assert upload.in_memory and upload.path is None
+        assert upload.sha256 == hashlib.sha256(DATA).hexdigest() and upload.size == len(DATA)
+        assert upload.source().read() == DATA
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_large_upload_spills_to_a_temp_file(tmp_dir, monkeypatch):
+    monkeypatch.setattr(spool, "READ_CHUNK_BYTES", 1000)
+    upload = spool_upload(io.BytesIO(DATA), "a.pdf", memory_bytes=1500)
+    assert not upload.in_memory
+    assert upload.source() == upload.path and upload.path.endswith(".pdf")
+    with open(upload.path, "rb") as f:
+        assert f.read() == DATA
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+    upload.close()
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_oversized_upload_is_rejected_without_leftovers(tmp_dir, monkeypatch):
+    monkeypatch.setattr(spool, "READ_CHUNK_BYTES", 1000)
+    with pytest.raises(UploadTooLarge):
+        spool_upload(io.BytesIO(DATA), "a.pdf", max_bytes=2500, memory_bytes=1500)
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_parser_stream_is_taken_over_without_a_copy(tmp_dir):
+    stream = SpoolingStream("b.png", memory_bytes=1500)
+    stream.write(DATA[:1000])
+    stream.write(DATA[1000:])
+    stream.seek(0)
+    assert stream.read(4) == DATA[:4]  # readable while the form is parsed
+    upload = spool_upload(stream, "renamed.png")
+    assert upload.filename == "renamed.png" and upload.path.endswith(".png")
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+    upload.close()
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_abandoned_stream_drops_its_temp_file(tmp_dir):
+    stream = SpoolingStream("c.pdf", memory_bytes=10)
+    stream.write(DATA)
+    assert len(list(tmp_dir.iterdir())) == 1
+    stream.close()
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_upload_over_the_limit_gets_413(tmp_dir, monkeypatch):
+    monkeypatch.setattr(app, "upload_stream_factory", lambda *args: SpoolingStream("", max_bytes=1000))
+    response = app.app.test_client().post("/upload", data={"file": (io.BytesIO(DATA), "big.pdf")})
+    assert response.status_code == 413
+    assert "exceeds 1000 bytes" in response.get_json()["error"]
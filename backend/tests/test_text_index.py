@@ -0,0 +1,93 @@
+import pytest
+
+import pipeline
+from text_index import TextIndex, minhash, similarity
+
+REPORT = "\n".join(f"Line {i}: firewall rule {i} allows port {1000 + i} from subnet {i % 7}" for i in range(200))
+# The same report with a few lines added: well above the default 0.9 similarity
+ADDED = "\n".join(f"Change {i}: rule {i} removed after review by the change board" for i in range(8))
+REVISED = REPORT + "\n" + ADDED
+OTHER = "\n".join(f"Invoice {i} for {i * 3} licences, paid on day {i % 28}" for i in range(200))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TextIndex(db_path=str(tmp_path / "text.sqlite3"))
+
+
+def test_signatures_estimate_similarity():
+    assert minhash("") is None and minhash("  \n ") is None
+    assert similarity(minhash(REPORT), minhash(REPORT)) == 1.0
+    assert similarity(minhash(REPORT), minhash(REVISED)) >= 0.9
+    assert similarity(minhash(REPORT), minhash(OTHER)) < 0.1
+
+
+def test_near_duplicate_returns_the_prior_value(index):
+    index.add(minhash(REPORT), REPORT, "PDF", "v1", ["description", "findings"])
+    match = index.lookup(minhash(REVISED), "PDF", "v1")
+    assert match.value == ["description", "findings"]
+    assert 0.9 <= match.similarity < 1.0 and match.added_text is None
+    assert index.lookup(minhash(OTHER), "PDF", "v1") is None
+
+
+def test_lookup_is_scoped_to_file_type_and_version(index):
+    index.add(minhash(REPORT), REPORT, "PDF", "v1", ["d", "f"])
+    assert index.lookup(minhash(REPORT), "PPT", "v1") is None
+    assert index.lookup(minhash(REPORT), "PDF", "v2") is None
+
+
+def test_lookup_respects_the_threshold(tmp_path):
+    strict = TextIndex(db_path=str(tmp_path / "strict.sqlite3"), threshold=1.0)
+    strict.add(minhash(REPORT), REPORT, "PDF", "v1", ["d", "f"])
+    assert strict.lookup(minhash(REVISED), "PDF", "v1") is None
+    assert strict.lookup(minhash(REPORT), "PDF", "v1").similarity == 1.0
+
+
+def test_the_most_similar_document_wins(index):
+    index.add(minhash(REVISED), REVISED, "PDF", "v1", ["revised", "f"])
+    index.add(minhash(REPORT), REPORT, "PDF", "v1", ["report", "f"])
+    assert index.lookup(minhash(REPORT), "PDF", "v1").value == ["report", "f"]
+
+
+def test_refresh_lists_only_the_added_lines(index, monkeypatch):
+    index.add(minhash(REPORT), REPORT, "PDF", "v1", ["d", "f"])
+    match = index.lookup(minhash(REVISED), "PDF", "v1", text=REVISED)
+    assert match.added_text == ADDED
+    assert index.lookup(minhash(REPORT), "PDF", "v1", text=REPORT).added_text == ""
+    monkeypatch.setattr("text_index.TEXT_REFRESH_MAX_CHARS", 120)
+    assert index.lookup(minhash(REVISED), "PDF", "v1", text=REVISED).added_text == "\n".join(ADDED.splitlines()[:2])
+
+
+def test_invalidate_hash_drops_only_that_uploads_documents(index):
+    index.add(minhash(REPORT), REPORT, "PDF", "v1", ["report", "f"], content_hash="a" * 64)
+    index.add(minhash(OTHER), OTHER, "PDF", "v1", ["other", "f"], content_hash="b" * 64)
+    index.invalidate_hash("a" * 64)
+    assert index.lookup(minhash(REPORT), "PDF", "v1") is None
+    assert index.lookup(minhash(OTHER), "PDF", "v1").value == ["other", "f"]
+
+
+def test_oldest_documents_are_evicted(tmp_path):
+    small = TextIndex(db_path=str(tmp_path / "small.sqlite3"), max_entries=1)
+    small.add(minhash(REPORT), REPORT, "PDF", "v1", ["report", "f"])
+    small.add(minhash(OTHER), OTHER, "PDF", "v1", ["other", "f"])
+    assert small.lookup(minhash(REPORT), "PDF", "v1") is None
+    assert small.lookup(minhash(OTHER), "PDF", "v1").value == ["other", "f"]
+
+
+# ------------------- Cache modes -------------------
+@pytest.fixture
+def pipeline_index(index, monkeypatch):
+    monkeypatch.setattr("text_index.text_index", index)
+    index.add(minhash(REPORT), REPORT, "PDF", pipeline.CACHE_VERSION, ["d", "f"])
+    return index
+
+
+def test_match_text_follows_the_cache_mode(pipeline_index):
+    stats = {}
+    signature, match = pipeline.match_text(REPORT, "PDF", stats, "use")
+    assert signature is not None and match.value == ["d", "f"]
+    assert stats["near_duplicate"]["similarity"] == 1.0
+    # refresh recomputes but still indexes the new result; bypass does neither
+    signature, match = pipeline.match_text(REPORT, "PDF", {}, "refresh")
+    assert signature is not None and match is None
+    assert pipeline.match_text(REPORT, "PDF", {}, "bypass") == (None, None)
@@ -0,0 +1,86 @@
+import pytest
+from pptx import Presentation
+from pptx.util import Inches
+
+import pipeline
+import unit_store
+from unit_store import UnitStore, load_unit, save_unit, unit_key
+
+UPLOAD = "a" * 64
+OTHER_UPLOAD = "b" * 64
+
+
+@pytest.fixture(autouse=True)
+def units(tmp_path, monkeypatch):
+    store = UnitStore(db_path=str(tmp_path / "units.sqlite3"))
+    monkeypatch.setattr(unit_store, "unit_store", store)
+    return store
+
+
+def test_keys_cover_the_unit_kind_settings_and_version(monkeypatch):
+    key = unit_key("abc", "slide")
+    assert key != unit_key("abc", "pdf_page")
+    assert unit_key("abc", "summary", "stub:m1") != unit_key("abc", "summary", "stub:m2")
+    monkeypatch.setattr(unit_store, "UNIT_VERSION", "next")
+    assert unit_key("abc", "slide") != key
+
+
+def test_units_follow_the_cache_mode():
+    save_unit("k", {"text": "t"}, "bypass")
+    assert load_unit("k") is None
+    save_unit("k", {"text": "t"})
+    assert load_unit("k") == {"text": "t"}
+    assert load_unit("k", "refresh") is None and load_unit("k", "bypass") is None
+    save_unit("k", {"text": "new"}, "refresh")
+    assert load_unit("k") == {"text": "new"}
+
+
+def test_reuse_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(unit_store, "UNIT_REUSE", False)
+    save_unit("k", {"text": "t"})
+    monkeypatch.setattr(unit_store, "UNIT_REUSE", True)
+    assert load_unit("k") is None
+
+
+def test_invalidate_hash_drops_units_an_upload_stored_or_reused(units):
+    save_unit("stored", {"text": "1"}, content_hash=UPLOAD)
+    save_unit("shared", {"text": "2"}, content_hash=OTHER_UPLOAD)
+    save_unit("unrelated", {"text": "3"}, content_hash=OTHER_UPLOAD)
+    assert load_unit("shared", content_hash=UPLOAD) == {"text": "2"}
+    units.invalidate_hash(UPLOAD)
+    assert load_unit("stored") is None and load_unit("shared") is None
+    assert load_unit("unrelated") == {"text": "3"}
+    # A fresh instance reads SQLite, not the memory tier
+    assert UnitStore(db_path=units.db_path).get("shared") is None
+
+
+# ------------------- Through the pipeline -------------------
+@pytest.fixture
+def deck(tmp_path):
+    prs = Presentation()
+    for title in ("Firewall change window", "Owner: Sarah Thompson"):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_textbox(Inches(1), Inches(1), Inches(4), Inches(1)).text = title
+    path = str(tmp_path / "deck.pptx")
+    prs.save(path)
+    return path
+
+
+def reused_slides(deck, mode, content_hash=UPLOAD):
+    stats = {}
+    pipeline.process_file(deck, "PPT", stats, mode, content_hash)
+    return stats["reused_units"]
+
+
+def test_pipeline_passes_the_cache_mode_to_the_unit_store(deck):
+    assert reused_slides(deck, "bypass") == 0
+    assert reused_slides(deck, "use") == 0  # bypass stored nothing
+    assert reused_slides(deck, "use") == 2
+    assert reused_slides(deck, "refresh") == 0
+    assert reused_slides(deck, "use") == 2
+
+
+def test_deleting_an_upload_drops_its_slides(deck):
+    reused_slides(deck, "use")
+    pipeline.invalidate_results(UPLOAD)
+    assert reused_slides(deck, "use", OTHER_UPLOAD) == 0
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# ------------------- Configuration -------------------
+TEXT_INDEX_DB_PATH = os.environ.get(
+    "TEXT_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_index.sqlite3")
+)
+# Estimated Jaccard similarity (of word shingles) above which a prior result is reused
+TEXT_SIMILARITY = float(os.environ.get("TEXT_SIMILARITY", 0.9))
+TEXT_INDEX_MAX_ENTRIES = int(os.environ.get("TEXT_INDEX_MAX_ENTRIES", 5000))
+# Added lines sent to the model when refreshing a near-duplicate's description
+TEXT_REFRESH_MAX_CHARS = int(os.environ.get("TEXT_REFRESH_MAX_CHARS", 8000))
+
+SHINGLE_WORDS = 5
+# 16 bands of 8 rows: documents at 0.9 similarity share a band with ~99.99% probability,
+# at 0.5 with ~6%, so lookups only compare signatures of plausible matches
+LSH_BANDS = 16
+LSH_ROWS = 8
+NUM_PERM = LSH_BANDS * LSH_ROWS
+_BLOCK = 4096  # shingles hashed per numpy step, bounds memory at _BLOCK x NUM_PERM
+
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.default_rng(1)  # fixed: signatures are persisted across processes
+# Multiply-shift hashing of 32-bit shingle hashes: (a * h + b) mod 2^64, top 32 bits
+_A = _rng.integers(0, 1 << 64, NUM_PERM, dtype=np.uint64, endpoint=False)
+_B = _rng.integers(0, 1 << 64, NUM_PERM, dtype=np.uint64, endpoint=False)
+
+_WORD_RE = re.compile(r"\w+")
+
+NearDuplicate = namedtuple("NearDuplicate", "value similarity added_text")
+
+
+# ------------------- MinHash -------------------
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS):
+    """Distinct 32-bit hashes of the text's overlapping word n-grams (lower-cased)."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    codes = {word: zlib.crc32(word.encode("utf-8")) for word in set(words)}
+    tokens = np.fromiter(map(codes.__getitem__, words), dtype=np.uint64, count=len(words))
+    size = min(size, len(tokens))
+    count = len(tokens) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * np.uint64(1000003) + tokens[offset:offset + count]  # wraps mod 2^64
+    return np.unique(hashes & np.uint64(0xFFFFFFFF))
+
+
+def minhash(text: str):
+    """NUM_PERM-value MinHash signature of the text, or None if it has no words."""
+    shingles = shingle_hashes(text)
+    if not len(shingles):
+        return None
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(shingles), _BLOCK):
+        block = shingles[start:start + _BLOCK, None]
+        signature = np.minimum(signature, ((block * _A + _B) >> np.uint64(32)).min(axis=0))
+    return signature
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def band_keys(signature):
+    return [
+        f"{band}:" + hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+def _line_hash(line: str) -> int:
+    return zlib.crc32(line.strip().encode("utf-8"))
+
+
+def line_hashes(text: str):
+    return np.unique(np.fromiter((_line_hash(line) for line in text.splitlines() if line.strip()), dtype=np.uint32))
+
+
+# ------------------- Index -------------------
+class TextIndex:
+    """SQLite-backed LSH index of MinHash signature -> prior (description, findings).
+
+    Besides the signature, each document keeps the hashes of its lines, so a
+    near-duplicate can be refreshed from just the lines that are new.
+    """
+
+    def __init__(self, db_path=TEXT_INDEX_DB_PATH, threshold=TEXT_SIMILARITY, max_entries=TEXT_INDEX_MAX_ENTRIES):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       file_type TEXT NOT NULL,
+                       version TEXT NOT NULL,
+                       signature BLOB NOT NULL,
+                       lines BLOB NOT NULL,
+                       value TEXT NOT NULL,
+                       created REAL NOT NULL
+                   )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS bands (
+                       key TEXT NOT NULL,
+                       doc_id INTEGER NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_key ON bands(key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_doc ON bands(doc_id)")
+            # SHA-256 of the upload each document came from, so DELETE /cache/<sha256> reaches it
+            if "content_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(documents)")}:
+                conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def lookup(self, signature, file_type: str, version: str, text: str = None):
+        """Most similar prior document at or above the threshold as a NearDuplicate, or None.
+
+        With text, added_text holds its lines that the prior document did not have
+        (up to TEXT_REFRESH_MAX_CHARS); without, it is None.
+        """
+        keys = band_keys(signature)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""SELECT id, signature, lines, value FROM documents
+                    WHERE file_type = ? AND version = ? AND id IN (
+                        SELECT doc_id FROM bands WHERE key IN ({','.join('?' * len(keys))})
+                    )""",
+                (file_type, version, *keys),
+            ).fetchall()
+        best = None
+        for _, stored, lines, value in rows:
+            score = similarity(signature, np.frombuffer(stored, dtype=np.uint64))
+            if score >= self.threshold and (best is None or score > best[0]):
+                best = (score, lines, value)
+        if best is None:
+            return None
+        score, lines, value = best
+        added_text = None
+        if text is not None:
+            added_text = self._added_text(text, np.frombuffer(zlib.decompress(lines), dtype=np.uint32))
+        return NearDuplicate(json.loads(value), score, added_text)
+
+    @staticmethod
+    def _added_text(text: str, known):
+        added, seen, size = [], set(), 0
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line in seen:
+                continue
+            seen.add(line)
+            index = np.searchsorted(known, _line_hash(line))
+            if index < len(known) and known[index] == _line_hash(line):
+                continue
+            size += len(line) + 1
+            if size > TEXT_REFRESH_MAX_CHARS:
+                break
+            added.append(line)
+        return "\n".join(added)
+
+    def add(self, signature, text: str, file_type: str, version: str, value, content_hash: str = None):
+        lines = zlib.compress(line_hashes(text).tobytes())
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                """INSERT INTO documents (file_type, version, signature, lines, value, created, content_hash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (file_type, version, signature.tobytes(), lines, json.dumps(value), time.time(), content_hash),
+            )
+            conn.executemany(
+                "INSERT INTO bands (key, doc_id) VALUES (?, ?)",
+                [(key, cursor.lastrowid) for key in band_keys(signature)],
+            )
+            count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            if count > self.max_entries:
+                # Drop the oldest documents and their bands
+                cutoff = conn.execute(
+                    "SELECT id FROM documents ORDER BY id LIMIT 1 OFFSET ?", (count - self.max_entries,)
+                ).fetchone()[0]
+                conn.execute("DELETE FROM bands WHERE doc_id < ?", (cutoff,))
+                conn.execute("DELETE FROM documents WHERE id < ?", (cutoff,))
+
+    def invalidate_hash(self, content_hash: str):
+        """Drop the documents (and their bands) recorded for an upload's SHA-256."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM bands WHERE doc_id IN (SELECT id FROM documents WHERE content_hash = ?)", (content_hash,)
+            )
+            conn.execute("DELETE FROM documents WHERE content_hash = ?", (content_hash,))
+
+
+text_index = TextIndex()
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sqlite3
+
+from cache import ResultCache, make_key
+from telemetry import CACHE_LOOKUPS, record_error
+
+# ------------------- Configuration -------------------
+UNIT_STORE_DB_PATH = os.environ.get(
+    "UNIT_STORE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "unit_store.sqlite3")
+)
+UNIT_STORE_TTL = int(os.environ.get("UNIT_STORE_TTL", 30 * 24 * 3600))
+UNIT_STORE_MEMORY_ENTRIES = int(os.environ.get("UNIT_STORE_MEMORY_ENTRIES", 1024))
+UNIT_STORE_DISK_MAX_BYTES = int(os.environ.get("UNIT_STORE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+# Set to 0 to extract, OCR and summarize every page and slide from scratch
+UNIT_REUSE = os.environ.get("UNIT_REUSE", "1") != "0"
+# Bump whenever extraction or masking changes what is stored for a unit
+UNIT_VERSION = "2"
+
+
+# ------------------- Store -------------------
+class UnitStore(ResultCache):
+    """ResultCache of unit artifacts that also records which uploads used each unit.
+
+    Units are keyed by their own content, not the upload's, so invalidate_hash
+    looks the upload's SHA-256 up in the sources table instead of matching a
+    key prefix.
+    """
+
+    def _init_db(self):
+        super()._init_db()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS sources (
+                       content_hash TEXT NOT NULL,
+                       key TEXT NOT NULL,
+                       PRIMARY KEY (content_hash, key)
+                   )"""
+            )
+
+    def add_source(self, key: str, content_hash: str):
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT OR IGNORE INTO sources (content_hash, key) VALUES (?, ?)", (content_hash, key))
+        except sqlite3.Error as e:
+            record_error("cache", e)
+
+    def invalidate_hash(self, content_hash: str):
+        """Drop every unit an upload (by SHA-256) stored or reused, even if other uploads share it."""
+        try:
+            with self._connect() as conn:
+                keys = [row[0] for row in conn.execute("SELECT key FROM sources WHERE content_hash = ?", (content_hash,))]
+                conn.execute("DELETE FROM sources WHERE content_hash = ?", (content_hash,))
+        except sqlite3.Error as e:
+            record_error("cache", e)
+            return
+        for key in keys:
+            self.invalidate(key)
+
+
+# Per-page / per-slide artifacts (masked text, OCR output, chunk summaries), keyed by
+# the unit's content hash so a revised document only reprocesses the units that changed.
+# Only masked text is stored: raw extracted text and OCR output never reach the disk.
+unit_store = UnitStore(
+    db_path=UNIT_STORE_DB_PATH, ttl=UNIT_STORE_TTL,
+    memory_entries=UNIT_STORE_MEMORY_ENTRIES, disk_max_bytes=UNIT_STORE_DISK_MAX_BYTES,
+)
+
+
+# ------------------- Keys -------------------
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def unit_key(content_hash: str, unit: str, settings: str = "") -> str:
+    """Store key for a unit ("pdf_page", "slide", ...) and the settings its artifacts depend on."""
+    return make_key(content_hash, unit, f"{UNIT_VERSION}:{settings}")
+
+
+# ------------------- Access -------------------
+def load_unit(key: str, mode: str = "use", content_hash: str = None):
+    """Stored artifacts (a dict) for key, or None if missing or reuse is off.
+
+    Follows the request's cache mode: only "use" looks units up. A hit is
+    recorded against content_hash (the upload's SHA-256) like a save.
+    """
+    if not UNIT_REUSE or mode != "use":
+        return None
+    value = unit_store.get(key)
+    CACHE_LOOKUPS.inc(cache="unit", result="miss" if value is None else "hit")
+    if value is not None and content_hash:
+        unit_store.add_source(key, content_hash)
+    return value
+
+
+def save_unit(key: str, value: dict, mode: str = "use", content_hash: str = None):
+    """Store a unit's artifacts ("refresh" overwrites them, "bypass" stores nothing)."""
+    if not UNIT_REUSE or mode == "bypass":
+        return
+    unit_store.set(key, value)
+    if content_hash:
+        unit_store.add_source(key, content_hash)